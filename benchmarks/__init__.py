@@ -0,0 +1 @@
+"""Offline micro-benchmarks of the plugin's hot paths; see ``benchmarks.run``."""
@@ -0,0 +1,153 @@
+"""Benchmarked operations.
+
+Each case is an async setup function registered with :func:`benchmark`; it
+prepares the stubs and returns the coroutine function timed by the runner.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+from benchmarks import stubs
+from src import storage
+from src.dtos.api import TrackTitles
+from src.services import lastfm, spotify
+from src.utils import http
+from src.utils.cache import TwoTierCache
+from src.utils.ratelimit import TokenBucket
+
+Operation = Callable[[], Awaitable[object]]
+CASES: dict[str, Callable[[], Awaitable[Operation]]] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+def _offline() -> storage._Dummy:
+    """Swap Redis for memory and lift the rate limiters, which would dominate."""
+    fake = storage._Dummy()
+    storage._redis = fake
+    spotify.spotify_limiter = TokenBucket(rate=1e9, capacity=1e9)
+    lastfm.lastfm_limiter = TokenBucket(rate=1e9, capacity=1e9)
+    return fake
+
+
+def _share_client(transport: httpx.AsyncBaseTransport):
+    """Install a stubbed client as the pooled client of the running loop."""
+    http._client = httpx.AsyncClient(transport=transport)
+    http._client_loop = asyncio.get_running_loop()
+
+
+def _spotify_client() -> spotify.SpotifyClient:
+    spotify._USER_IDS.clear()
+    return spotify.SpotifyClient(
+        "bench-token", httpx.AsyncClient(transport=stubs.spotify_transport())
+    )
+
+
+@benchmark("add_tracks_resolution")
+async def add_tracks_resolution() -> Operation:
+    """Resolve and add 50 uncached titles."""
+    fake = _offline()
+    client = _spotify_client()
+    titles = TrackTitles(titles=[f"title {i}" for i in range(50)])
+
+    async def op():
+        fake.store.clear()
+        return await client.add_tracks_to_playlist(stubs.PLAYLIST_ID, titles)
+
+    return op
+
+
+@benchmark("playlists_pagination")
+async def playlists_pagination() -> Operation:
+    """List all 500 playlists of the user, 50 per page."""
+    _offline()
+    client = _spotify_client()
+
+    async def op():
+        return await client.get_playlists(limit=None)
+
+    return op
+
+
+@benchmark("playlist_tracks_projection")
+async def playlist_tracks_projection() -> Operation:
+    """Fetch and project a 1000-track playlist whose snapshot always changed."""
+    _offline()
+    client = _spotify_client()
+
+    async def op():
+        return await client.get_tracks_from_playlist(stubs.PLAYLIST_ID)
+
+    return op
+
+
+@benchmark("recommendations_dedupe")
+async def recommendations_dedupe() -> Operation:
+    """Filter 100 recommendations against the user's history."""
+    _offline()
+    client = _spotify_client()
+
+    async def op():
+        return await client.recommendations(seed_genres="rock", limit=100)
+
+    return op
+
+
+@benchmark("lastfm_cached_hit")
+async def lastfm_cached_hit() -> Operation:
+    """Serve a Last.fm response from the in-process cache."""
+    _offline()
+    lastfm._cache = TwoTierCache(name="lastfm")
+    _share_client(stubs.lastfm_transport())
+    service = lastfm.LastFMService()
+    service.api_key = "bench"
+    params = service._tags_params("Artist", "Song")
+    await service._cached(params)
+
+    async def op():
+        return await service._cached(params)
+
+    return op
+
+
+@benchmark("lastfm_cached_miss")
+async def lastfm_cached_miss() -> Operation:
+    """Fetch a Last.fm response missing from both cache tiers."""
+    fake = _offline()
+    _share_client(stubs.lastfm_transport())
+    service = lastfm.LastFMService()
+    service.api_key = "bench"
+    params = service._tags_params("Artist", "Song")
+
+    async def op():
+        fake.store.clear()
+        lastfm._cache = TwoTierCache(name="lastfm")
+        return await service._cached(params)
+
+    return op
+
+
+@benchmark("valid_access_token")
+async def valid_access_token() -> Operation:
+    """Return the in-memory access token."""
+    from src import auth
+
+    _offline()
+    auth.token_manager.set({
+        "access_token": "bench", "refresh_token": "r", "expires_at": time.time() + 3600,
+    })
+
+    async def op():
+        return await auth.valid_access_token()
+
+    return op
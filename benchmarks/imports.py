@@ -0,0 +1,89 @@
+"""Profile the cold-start import of the serverless entry point.
+
+Usage::
+
+    python -m benchmarks.imports            # report the slowest imports
+    python -m benchmarks.imports --top 40
+
+``api.index`` is imported in a fresh interpreter with ``-X importtime``, as
+on a cold serverless start.  The exit status is 1 when the import takes
+longer than ``COLD_START_BUDGET_MS`` or loads one of ``LAZY_MODULES``, which
+must only be imported by the requests that use them.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ENTRY = "api.index"
+# Total import time allowed, interpreter start-up included.
+BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "1500"))
+LAZY_MODULES = (
+    "upstash_redis",
+    "sqlite3",
+    "src.services.lastfm",
+    "src.services.library",
+    "src.services.musicbrainz",
+)
+
+
+def profile(entry: str = ENTRY) -> tuple[dict[str, tuple[float, float]], set[str]]:
+    """Import ``entry`` in a new interpreter.
+
+    Returns ``{module: (self_ms, cumulative_ms)}`` in import order and the
+    names of every module loaded afterwards.
+    """
+    code = f"import json, sys, {entry}; print(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        check=True,
+    )
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue  # the column header
+        timings[fields[2].strip()] = (int(fields[0]) / 1000, int(fields[1]) / 1000)
+    return timings, set(json.loads(proc.stdout.splitlines()[-1]))
+
+
+def check(timings: dict, loaded: set[str], budget_ms: float = BUDGET_MS) -> list[str]:
+    """Return a message per budget overrun or eagerly imported lazy module."""
+    problems = [f"{name} is imported at start-up" for name in LAZY_MODULES if name in loaded]
+    total = sum(own for own, _ in timings.values())
+    if total > budget_ms:
+        problems.append(f"import took {total:.0f} ms, budget {budget_ms:.0f} ms")
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=20, help="modules listed")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    timings, loaded = profile()
+    print(f"{'module':<50} {'self ms':>8} {'cumul. ms':>10}")
+    slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (own, cumulative) in slowest[: args.top]:
+        print(f"{name:<50} {own:>8.1f} {cumulative:>10.1f}")
+    print(f"total {sum(own for own, _ in timings.values()):.1f} ms, {len(timings)} modules")
+
+    problems = check(timings, loaded, args.budget_ms)
+    for message in problems:
+        print("REGRESSION", message, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
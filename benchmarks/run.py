@@ -0,0 +1,131 @@
+"""Run the offline benchmarks and compare them with the saved baseline.
+
+Usage::
+
+    python -m benchmarks.run              # compare with benchmarks/baseline.json
+    python -m benchmarks.run --save       # record a new baseline
+    python -m benchmarks.run -k lastfm    # only cases whose name contains "lastfm"
+
+Each case reports operations per second and, from ``tracemalloc``, the peak
+memory allocated during one operation and the memory blocks it leaves
+behind.  The exit status is 1 when a case is slower or allocates more than
+the baseline allows (``BENCH_SPEED_TOLERANCE``, ``BENCH_MEMORY_TOLERANCE``).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BASELINE = Path(__file__).with_name("baseline.json")
+# Fraction of the baseline's ops/s a case may lose, and of its peak memory it may add.
+SPEED_TOLERANCE = float(os.getenv("BENCH_SPEED_TOLERANCE", "0.3"))
+MEMORY_TOLERANCE = float(os.getenv("BENCH_MEMORY_TOLERANCE", "0.1"))
+WARMUP = 5
+ALLOC_RUNS = 20
+
+
+async def measure(setup, min_time: float) -> dict:
+    op = await setup()
+    for _ in range(WARMUP):
+        await op()
+
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        await op()
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time and runs >= 10:
+            break
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        peaks = []
+        for _ in range(ALLOC_RUNS):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await op()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "ops_per_sec": round(runs / elapsed, 1),
+        "peak_kib_per_op": round(sum(peaks) / len(peaks) / 1024, 1),
+        "retained_blocks_per_op": round(retained / ALLOC_RUNS, 1),
+    }
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    speed_tolerance: float = SPEED_TOLERANCE,
+    memory_tolerance: float = MEMORY_TOLERANCE,
+) -> list[str]:
+    """Return a message per metric that regressed beyond its tolerance."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        floor = base["ops_per_sec"] * (1 - speed_tolerance)
+        if result["ops_per_sec"] < floor:
+            regressions.append(
+                f"{name}: {result['ops_per_sec']} ops/s, baseline {base['ops_per_sec']}"
+            )
+        # One KiB of slack keeps tiny operations from flapping.
+        ceiling = base["peak_kib_per_op"] * (1 + memory_tolerance) + 1
+        if result["peak_kib_per_op"] > ceiling:
+            regressions.append(
+                f"{name}: {result['peak_kib_per_op']} KiB/op, baseline {base['peak_kib_per_op']}"
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="pattern", default="", help="only run matching cases")
+    parser.add_argument("--save", action="store_true", help="write the results as baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per case")
+    args = parser.parse_args(argv)
+
+    from benchmarks.cases import CASES
+
+    results = {}
+    for name, setup in CASES.items():
+        if args.pattern not in name:
+            continue
+        results[name] = asyncio.run(measure(setup, args.min_time))
+        r = results[name]
+        print(
+            f"{name:<30} {r['ops_per_sec']:>10.1f} ops/s"
+            f" {r['peak_kib_per_op']:>10.1f} KiB/op"
+            f" {r['retained_blocks_per_op']:>8.1f} blocks retained/op"
+        )
+
+    if args.save:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --save first")
+        return 0
+    regressions = compare(results, json.loads(args.baseline.read_text()))
+    for message in regressions:
+        print("REGRESSION", message, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Offline stand-ins for Spotify and Last.fm used by the benchmarks."""
+from __future__ import annotations
+
+import itertools
+
+import httpx
+
+PLAYLIST_ID = "1234567890123456789012"
+PLAYLIST_SIZE = 1000
+USER_PLAYLISTS = 500
+
+
+def _track(key) -> dict:
+    return {
+        "name": f"Song {key}",
+        "uri": f"spotify:track:{key}",
+        "album": {"name": "Album", "id": "al", "images": [{"url": "https://i.scdn.co/x"}]},
+        "artists": [{
+            "name": "Artist", "id": "ar", "uri": "spotify:artist:ar",
+            "href": "https://api.spotify.com/v1/artists/ar",
+            "external_urls": {"spotify": "https://open.spotify.com/artist/ar"},
+            "type": "artist",
+        }],
+        "duration_ms": 200000,
+        "explicit": False,
+        "popularity": 50,
+        "available_markets": ["FR", "US", "GB", "DE"],
+    }
+
+
+def _page(request: httpx.Request, total: int, item) -> httpx.Response:
+    offset = int(request.url.params.get("offset", 0))
+    limit = int(request.url.params.get("limit", 20))
+    items = [item(i) for i in range(offset, min(offset + limit, total))]
+    return httpx.Response(200, json={"items": items, "total": total, "next": None})
+
+
+def spotify_transport() -> httpx.MockTransport:
+    """Serve the Spotify endpoints the benchmarks exercise.
+
+    The playlist snapshot changes on every metadata request so contents are
+    never served from cache, and each recommendation batch overlaps the
+    previous one by half.
+    """
+    snapshots = itertools.count()
+    recommendations = itertools.count()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path == "/v1/me":
+            return httpx.Response(200, json={"id": "bench"})
+        if path == "/v1/search":
+            q = request.url.params["q"]
+            return httpx.Response(200, json={"tracks": {"items": [_track(q)]}})
+        if path == f"/v1/playlists/{PLAYLIST_ID}":
+            return httpx.Response(200, json={"snapshot_id": f"s{next(snapshots)}"})
+        if path == f"/v1/playlists/{PLAYLIST_ID}/tracks":
+            if request.method == "POST":
+                return httpx.Response(201, json={"snapshot_id": f"s{next(snapshots)}"})
+            return _page(request, PLAYLIST_SIZE, lambda i: {"track": _track(i)})
+        if path == "/v1/me/playlists":
+            return _page(request, USER_PLAYLISTS, lambda i: {
+                "name": f"Playlist {i}", "id": f"p{i}", "owner": {"id": "bench"},
+                "tracks": {"total": 10}, "images": [],
+            })
+        if path == "/v1/recommendations":
+            start = next(recommendations) * 50
+            tracks = [_track(f"r{i}") for i in range(start, start + 100)]
+            return httpx.Response(200, json={"tracks": tracks})
+        return httpx.Response(404, json={"error": path})
+
+    return httpx.MockTransport(handler)
+
+
+def lastfm_transport() -> httpx.MockTransport:
+    body = {"toptags": {"tag": [{"name": f"tag{i}", "count": 100 - i} for i in range(50)]}}
+    return httpx.MockTransport(lambda request: httpx.Response(200, json=body))
@@ -1,18 +1,39 @@
 # src/auth.py
+from collections import OrderedDict
+from functools import lru_cache
+from typing import NamedTuple
 from urllib.parse import urlencode, quote
-import os, httpx, time
-from fastapi import APIRouter, HTTPException
+import asyncio, os, httpx, secrets, time
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import RedirectResponse, JSONResponse
-from .storage import save_tokens, load_tokens
+from fastapi.security import HTTPAuthorizationCredentials
+from . import storage
+from .storage import aload_tokens, aload_user_tokens, asave_tokens, asave_user_tokens
+from .utils import bearer_scheme, metrics
+from .utils.http import client_session, get_http_client
 
 router = APIRouter(tags=["auth"])
 
-CLIENT_ID = os.getenv("CLIENT_ID")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET")
-REDIRECT_URI = os.getenv("REDIRECT_URI")
-if not REDIRECT_URI:
-    raise ValueError("REDIRECT_URI env var missing; set it in Railway and Spotify dashboard")
-REDIRECT_URI = REDIRECT_URI.strip()
+
+
+class OAuthSettings(NamedTuple):
+    client_id: str | None
+    client_secret: str | None
+    redirect_uri: str
+
+
+@lru_cache(maxsize=1)
+def oauth_settings() -> OAuthSettings:
+    """Read the Spotify app credentials once, on first use.
+
+    Deferred from import time so that a cold start only pays for it on the
+    routes that talk to Spotify's accounts service.
+    """
+    redirect_uri = os.getenv("REDIRECT_URI")
+    if not redirect_uri:
+        raise ValueError("REDIRECT_URI env var missing; set it in Railway and Spotify dashboard")
+    return OAuthSettings(os.getenv("CLIENT_ID"), os.getenv("CLIENT_SECRET"), redirect_uri.strip())
+
 
 SCOPES = (
     "user-read-playback-state "
@@ -31,45 +52,246 @@ SCOPES = (
     "user-read-playback-position"
 )
 
+# Cookie carrying the session issued by ``/auth/callback``.
+SESSION_COOKIE = "spotigen_session"
+# Requests without a session or bearer fall back to the tokens of the last
+# account authorized here; set to 0 when one deployment serves many users.
+SINGLE_USER_TOKENS = os.getenv("SINGLE_USER_TOKENS", "1").lower() in ("1", "true", "yes")
+# Users whose tokens, and sessions whose user, are kept in process memory.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+# Seconds a user found without stored tokens is not looked up again.
+TOKEN_MISS_TTL = float(os.getenv("TOKEN_MISS_TTL", "60"))
+
 # ---------- Internal helpers -------------------------------------------------
 
 
 
-def valid_access_token() -> str | None:
-    tokens = load_tokens()
-    if not tokens:
-        return None
-    if tokens["expires_at"] > time.time():
-        return tokens["access_token"]
-
-    r = httpx.post(
-        "https://accounts.spotify.com/api/token",
-        data={
-            "grant_type": "refresh_token",
-            "refresh_token": tokens["refresh_token"],
-            "client_id": CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
-        },
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        timeout=15,
-    )
-    if r.status_code == 200:
+async def _request_tokens(data: dict, http_client: httpx.AsyncClient | None = None) -> httpx.Response:
+    settings = oauth_settings()
+    started = time.perf_counter()
+    async with client_session(http_client) as client:
+        r = await client.post(
+            "https://accounts.spotify.com/api/token",
+            data=data | {"client_id": settings.client_id, "client_secret": settings.client_secret},
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            timeout=15,
+        )
+    metrics.observe_upstream("spotify_accounts", "POST /api/token", r.status_code, started)
+    return r
+
+
+class TokenManager:
+    """Keep the stored Spotify tokens of one user in memory until they expire.
+
+    Storage is only read on a cold start or once the token has expired, and
+    concurrent callers hitting an expired token share a single in-flight
+    refresh whose result is persisted.  A missing record is remembered for
+    ``TOKEN_MISS_TTL`` seconds, or until ``set`` stores one.  Without
+    ``user_id`` the single-user record (``save_tokens``) is managed.
+    """
+
+    def __init__(self, user_id: str | None = None):
+        self.user_id = user_id
+        self._tokens: dict | None = None
+        self._refreshing: asyncio.Future | None = None
+        self._missing_until = 0.0
+
+    def set(self, tokens: dict | None):
+        self._tokens = tokens
+        self._missing_until = 0.0
+
+    async def load(self, reload: bool = False) -> dict | None:
+        """Return the cached tokens, reading storage when empty or ``reload``."""
+        if self._tokens is None or reload:
+            if self.user_id is None:
+                self._tokens = await aload_tokens()
+            else:
+                self._tokens = await aload_user_tokens(self.user_id)
+            if self._tokens is None:
+                self._missing_until = time.monotonic() + TOKEN_MISS_TTL
+        return self._tokens
+
+    async def _save(self, tokens: dict):
+        if self.user_id is None:
+            await asave_tokens(tokens)
+        else:
+            await asave_user_tokens(self.user_id, tokens)
+
+    async def get(self, http_client: httpx.AsyncClient | None = None) -> str | None:
+        tokens = self._tokens
+        if tokens is not None and tokens["expires_at"] > time.time():
+            return tokens["access_token"]
+        if tokens is None and self._missing_until > time.monotonic():
+            return None
+        tokens = await self.refresh(http_client, force=False)
+        return tokens["access_token"] if tokens else None
+
+    async def refresh(
+        self, http_client: httpx.AsyncClient | None = None, force: bool = True
+    ) -> dict | None:
+        """Refresh the access token, joining a refresh already in flight.
+
+        Storage is re-read first since another worker may already have saved
+        newer tokens; unless ``force`` is set, those are used while still valid.
+        """
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh(http_client, force))
+            self._refreshing.add_done_callback(self._refresh_done)
+        return await asyncio.shield(self._refreshing)
+
+    def _refresh_done(self, future: asyncio.Future):
+        if self._refreshing is future:
+            self._refreshing = None
+
+    async def _refresh(
+        self, http_client: httpx.AsyncClient | None, force: bool
+    ) -> dict | None:
+        tokens = await self.load(reload=True)
+        if not tokens:
+            return None
+        if not force and tokens["expires_at"] > time.time():
+            return tokens
+        r = await _request_tokens(
+            {"grant_type": "refresh_token", "refresh_token": tokens["refresh_token"]},
+            http_client,
+        )
+        if r.status_code != 200:
+            return None
         new_tokens = tokens | r.json()
-        if "expires_in" in new_tokens:
-            new_tokens["expires_at"] = int(time.time()) + new_tokens["expires_in"] - 60
-        save_tokens(new_tokens)
-        return new_tokens["access_token"]
-    return None
+        new_tokens["expires_at"] = int(time.time()) + new_tokens.get("expires_in", 0) - 60
+        await self._save(new_tokens)
+        self._tokens = new_tokens
+        return new_tokens
+
+
+token_manager = TokenManager()
+_TOKEN_MANAGERS: OrderedDict[str, TokenManager] = OrderedDict()
+# session id -> {"user_id": ..., "expires_at": ...}
+_SESSIONS: OrderedDict[str, dict] = OrderedDict()
+
+
+def token_manager_for(user_id: str | None) -> TokenManager:
+    """Return the manager of ``user_id``, or the single-user one for ``None``."""
+    if user_id is None:
+        return token_manager
+    manager = _TOKEN_MANAGERS.get(user_id)
+    if manager is None:
+        manager = _TOKEN_MANAGERS[user_id] = TokenManager(user_id)
+        if len(_TOKEN_MANAGERS) > TOKEN_CACHE_SIZE:
+            _TOKEN_MANAGERS.popitem(last=False)
+    else:
+        _TOKEN_MANAGERS.move_to_end(user_id)
+    return manager
+
+
+async def valid_access_token(
+    http_client: httpx.AsyncClient | None = None, user_id: str | None = None
+) -> str | None:
+    """Return a valid access token of ``user_id`` (or of the single user)."""
+    if user_id is None and not SINGLE_USER_TOKENS:
+        return None
+    return await token_manager_for(user_id).get(http_client)
+
+
+def _remember_session(session_id: str, session: dict):
+    _SESSIONS[session_id] = session
+    _SESSIONS.move_to_end(session_id)
+    if len(_SESSIONS) > TOKEN_CACHE_SIZE:
+        _SESSIONS.popitem(last=False)
+
+
+async def session_user_id(session_id: str) -> str | None:
+    """Return the user bound to ``session_id`` while the session is valid."""
+    session = _SESSIONS.get(session_id)
+    metrics.count_cache("session", hits=session is not None, misses=session is None)
+    if session is None:
+        session = await asyncio.to_thread(storage.load_session, session_id)
+        if session is None:
+            return None
+        _remember_session(session_id, session)
+    if session["expires_at"] <= time.time():
+        _SESSIONS.pop(session_id, None)
+        return None
+    return session["user_id"]
+
+
+async def resolve_user_id(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials | None,
+    http_client: httpx.AsyncClient | None = None,
+) -> str | None:
+    """Identify the Spotify user behind a request, ``None`` when anonymous.
+
+    The session cookie wins; a bearer credential is either a session issued
+    by ``/auth/callback`` or a Spotify access token, identified through
+    ``/me`` (cached per token).
+    """
+    from src.services.spotify import SpotifyClient
+
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if session_id:
+        user_id = await session_user_id(session_id)
+        if user_id is not None:
+            return user_id
+    if not credentials or credentials.scheme != "Bearer" or not credentials.credentials:
+        return None
+    client = SpotifyClient(credentials.credentials, http_client=http_client)
+    user_id = client.known_user_id()
+    if user_id is None:
+        user_id = await session_user_id(credentials.credentials)
+    if user_id is None:
+        user_id = await client.get_my_user_id()
+    return user_id
+
+
+async def current_user_id(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+) -> str | None:
+    return await resolve_user_id(request, credentials, http_client)
+
+
+async def request_access_token(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials | None,
+    http_client: httpx.AsyncClient | None = None,
+) -> str | None:
+    """Return the Spotify access token to serve a request with.
+
+    Users without a usable record of their own (authorized through ChatGPT's
+    OAuth flow, or before per-user records existed) are served with the
+    Spotify token they sent.  The single-user record only serves anonymous
+    requests: it holds whichever account authorized last.
+    """
+    from src.services.spotify import SpotifyClient
+
+    user_id = await resolve_user_id(request, credentials, http_client)
+    token = await valid_access_token(http_client, user_id=user_id)
+    if token is None and user_id is not None:
+        bearer = credentials.credentials if credentials else None
+        if bearer and SpotifyClient(bearer).known_user_id() == user_id:
+            return bearer
+    return token
+
+
+async def current_access_token(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+) -> str | None:
+    return await request_access_token(request, credentials, http_client)
 
 # ---------- Public routes ----------------------------------------------------
 
 @router.get("/login")
 def login():
     """Redirect user to Spotify authorization."""
+    settings = oauth_settings()
     params = {
-        "client_id": CLIENT_ID,
+        "client_id": settings.client_id,
         "response_type": "code",
-        "redirect_uri": REDIRECT_URI,
+        "redirect_uri": settings.redirect_uri,
         "scope": SCOPES,
     }
     query = urlencode(params, quote_via=quote, safe="")
@@ -77,54 +299,67 @@ def login():
 
 
 @router.get("/callback")
-def callback(code: str | None = None, error: str | None = None):
+async def callback(
+    code: str | None = None,
+    error: str | None = None,
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+):
     """Spotify redirect URI used to exchange the `code` for tokens."""
     if error:
         raise HTTPException(400, f"Spotify auth error: {error}")
 
-    r = httpx.post(
-        "https://accounts.spotify.com/api/token",
-        data={
-            "grant_type": "authorization_code",
-            "code": code,
-            "redirect_uri": REDIRECT_URI,
-            "client_id": CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
-        },
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        timeout=15,
+    r = await _request_tokens(
+        {"grant_type": "authorization_code", "code": code, "redirect_uri": oauth_settings().redirect_uri},
+        http_client,
     )
     if r.status_code != 200:
         raise HTTPException(r.status_code, "Impossible d’obtenir le jeton Spotify")
 
     data = r.json()
     data["expires_at"] = int(time.time()) + data.get("expires_in", 0) - 60
-    save_tokens(data)
-    return JSONResponse({"message": "Authentification réussie."})
+
+    from src.services.spotify import SpotifyClient
+
+    user_id = await SpotifyClient(data["access_token"], http_client=http_client).get_my_user_id()
+    session_id = secrets.token_urlsafe(32)
+    saves = [
+        asave_user_tokens(user_id, data),
+        asyncio.to_thread(storage.save_session, session_id, user_id),
+    ]
+    if SINGLE_USER_TOKENS:
+        saves.append(asave_tokens(data))
+    _, session, *_ = await asyncio.gather(*saves)
+    token_manager_for(user_id).set(data)
+    _remember_session(session_id, session)
+    if SINGLE_USER_TOKENS:
+        token_manager.set(data)
+
+    response = JSONResponse({"message": "Authentification réussie.", "session": session_id})
+    response.set_cookie(
+        SESSION_COOKIE,
+        session_id,
+        max_age=storage.SESSION_TTL,
+        httponly=True,
+        secure=True,
+        samesite="lax",
+    )
+    return response
 
 
 @router.get("/refresh")
-def refresh():
+async def refresh(
+    user_id: str | None = Depends(current_user_id),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+):
     """Force refresh of the access token using the stored refresh token."""
-    tok = load_tokens()
+    if user_id is None and not SINGLE_USER_TOKENS:
+        raise HTTPException(401, "Not authenticated")
+    manager = token_manager_for(user_id)
+    tok = await manager.load()
     if not tok:
         raise HTTPException(400, "Pas de refresh_token enregistré.")
 
-    r = httpx.post(
-        "https://accounts.spotify.com/api/token",
-        data={
-            "grant_type": "refresh_token",
-            "refresh_token": tok["refresh_token"],
-            "client_id": CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
-        },
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        timeout=15,
-    )
-    if r.status_code != 200:
-        raise HTTPException(r.status_code, "Échec refresh_token")
-
-    new_tok = tok | r.json()
-    new_tok["expires_at"] = int(time.time()) + new_tok.get("expires_in", 0) - 60
-    save_tokens(new_tok)
+    new_tok = await manager.refresh(http_client)
+    if not new_tok:
+        raise HTTPException(400, "Échec refresh_token")
     return {"access_token": new_tok["access_token"]}
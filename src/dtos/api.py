@@ -22,3 +22,10 @@ class Track(BaseModel):
 
 class PlaylistTracksResponse(BaseModel):
     tracks: list[Track]
+
+class TrackRef(BaseModel):
+    artist: str
+    title: str
+
+class TrackRefs(BaseModel):
+    tracks: list[TrackRef]
@@ -1,16 +1,25 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Literal
 
 from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 
-from src.dtos.api import TrackTitles, TrackURIs
-from src.services.spotify import SpotifyClient
-from src.services.lastfm import LastFMService
-from src.utils import get_redis_spotify_client, get_spotify_client
+from src import storage
+from src.dtos.api import TrackRefs, TrackTitles, TrackURIs
+from src.services.spotify import SpotifyClient, spotify_limiter
+from src.utils import get_redis_spotify_client, get_spotify_client, metrics, projection
+from src.utils.http import close_http_client, open_http_client
+from src.utils.responses import FastJSONResponse, dumps, json_response
 
 # ---------------------------------------------------------------------------
 # Configuration
@@ -18,7 +27,32 @@ from src.utils import get_redis_spotify_client, get_spotify_client
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 
+# The Last.fm and library services, and the Redis client, are only loaded
+# when first needed: serverless cold starts import this module on the
+# critical path of the first request.
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Share one pooled HTTP client across all requests of this worker.
+
+    Long-running servers also connect to Redis here, before the first
+    request; serverless invocations without a lifespan open both on first use.
+    """
+    from src.auth import oauth_settings
+
+    oauth_settings()  # fail at startup, not on the first login, when misconfigured
+    app.state.http_client = await open_http_client()
+    await asyncio.to_thread(storage.redis)
+    try:
+        yield
+    finally:
+        await close_http_client()
+
+
 app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     servers=[{"url": "https://spotigen-chat-gpt-plugin-production.up.railway.app"}],
     openapi_url=None,
     docs_url=None,
@@ -36,6 +70,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Static files (.well‑known + logo)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/.well-known", StaticFiles(directory=".well-known"), name="well-known")
@@ -63,6 +99,18 @@ async def custom_openapi() -> FileResponse:
     return FileResponse("static/spec.json", media_type="application/json")
 
 
+@app.get("/ratelimit", include_in_schema=False)
+async def ratelimit_stats():
+    """Expose the Spotify limiter's queue depth and wait times."""
+    return {"spotify": spotify_limiter.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Expose latency histograms, cache counters and in-flight requests."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # ---------------------------------------------------------------------------
 # Last.fm helper endpoints
 # ---------------------------------------------------------------------------
@@ -70,14 +118,34 @@ async def custom_openapi() -> FileResponse:
 
 @app.get("/lastfm/tags")
 async def lastfm_tags(artist: str, title: str, limit: int = 5):
+    from src.services.lastfm import LastFMService
+
+    service = LastFMService()
+    return await service.track_tags(artist, title, limit)
+
+
+@app.post("/lastfm/tags/batch")
+async def lastfm_tags_batch(body: TrackRefs, limit: int = 5):
+    from src.services.lastfm import LastFMService
+
     service = LastFMService()
-    return service.track_tags(artist, title, limit)
+    tags = await service.track_tags_batch([(t.artist, t.title) for t in body.tracks], limit)
+    return [
+        {"artist": t.artist, "title": t.title, "tags": track_tags}
+        for t, track_tags in zip(body.tracks, tags)
+    ]
 
 
 @app.get("/lastfm/scrobbles")
 async def lastfm_scrobbles(start: int, end: int):
+    from src.services.lastfm import LastFMService
+
     service = LastFMService()
-    return service.scrobble_history(start, end)
+    try:
+        history = await service.scrobble_history(start, end)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid range: {exc}")
+    return json_response(history)
 
 
 # ---------------------------------------------------------------------------
@@ -110,9 +178,24 @@ async def create_playlist(
 async def get_playlist_tracks(
     playlist_id: str,
     spotify_client: Annotated[SpotifyClient, Depends(get_spotify_client)],
+    stream: bool = False,
 ):
     true_id = await spotify_client._playlist_id(playlist_id)
-    return await spotify_client.get_tracks_from_playlist(true_id)
+    if not stream:
+        return json_response(await spotify_client.get_tracks_from_playlist(true_id))
+
+    pages = spotify_client.iter_tracks_from_playlist(true_id)
+    # Fetch the first page before answering so upstream errors keep their status.
+    first = await anext(pages)
+
+    async def ndjson():
+        for track in first:
+            yield dumps(track) + b"\n"
+        async for page in pages:
+            for track in page:
+                yield dumps(track) + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 
 @app.post("/playlist/{playlist_id}/tracks")
@@ -122,8 +205,7 @@ async def add_tracks_to_playlist(
     spotify_client: Annotated[SpotifyClient, Depends(get_spotify_client)],
 ):
     true_id = await spotify_client._playlist_id(playlist_id)
-    await spotify_client.add_tracks_to_playlist(true_id, track_titles)
-    return PlainTextResponse(status_code=200)
+    return await spotify_client.add_tracks_to_playlist(true_id, track_titles)
 
 
 @app.delete("/playlist/{playlist_id}/tracks")
@@ -169,13 +251,40 @@ async def previous_track(
     return PlainTextResponse(status_code=200)
 
 
+def _market_for(tree: projection.Tree | None) -> str | None:
+    """Let Spotify drop ``available_markets`` unless the caller selected it."""
+    return None if projection.mentions(tree, "available_markets") else "from_token"
+
+
 @app.get("/playlists")
 async def playlists(
     spotify_client: Annotated[SpotifyClient, Depends(get_redis_spotify_client)],
     limit: int = 20,
     offset: int = 0,
+    fields: str | None = None,
 ):
-    return await spotify_client.get_playlists(limit=limit, offset=offset)
+    tree = projection.select(fields, "playlists")
+    return json_response(projection.project(
+        await spotify_client.get_playlists(limit=limit, offset=offset), tree
+    ))
+
+
+def _use_mirror(tree: projection.Tree | None, filtered: bool) -> bool:
+    """Serve from the library mirror unless disabled or markets are selected.
+
+    The mirror is synced with ``market=from_token`` and holds no
+    ``available_markets``; filters and sorting need the mirror.
+    """
+    from src.services import library
+
+    live = not library.LIBRARY_MIRROR or (
+        tree is not None and projection.mentions(tree, "available_markets")
+    )
+    if live and filtered:
+        raise HTTPException(
+            status_code=400, detail="q, artist and sort need the library mirror"
+        )
+    return not live
 
 
 @app.get("/library/tracks")
@@ -183,8 +292,27 @@ async def library_tracks(
     spotify_client: Annotated[SpotifyClient, Depends(get_redis_spotify_client)],
     limit: int = 50,
     offset: int = 0,
+    fields: str | None = None,
+    q: str | None = None,
+    artist: str | None = None,
+    sort: Literal["added_at", "name", "artist", "album", "duration_ms"] = "added_at",
+    order: Literal["asc", "desc"] = "desc",
 ):
-    return await spotify_client.get_library_tracks(limit=limit, offset=offset)
+    """Saved tracks, newest first; ``q`` matches title, artist or album."""
+    tree = projection.select(fields, "library_tracks")
+    filtered = bool(q or artist) or sort != "added_at" or order != "desc"
+    if _use_mirror(tree, filtered):
+        from src.services.library import library_mirror
+
+        tracks = await library_mirror.search(
+            spotify_client, "tracks", q=q, artist=artist, sort=sort, order=order,
+            limit=limit, offset=offset,
+        )
+    else:
+        tracks = await spotify_client.get_library_tracks(
+            limit=limit, offset=offset, market=_market_for(tree)
+        )
+    return json_response(projection.project(tracks, tree))
 
 
 @app.get("/library/albums")
@@ -192,8 +320,27 @@ async def library_albums(
     spotify_client: Annotated[SpotifyClient, Depends(get_redis_spotify_client)],
     limit: int = 50,
     offset: int = 0,
+    fields: str | None = None,
+    q: str | None = None,
+    artist: str | None = None,
+    sort: Literal["added_at", "name", "artist", "release_date"] = "added_at",
+    order: Literal["asc", "desc"] = "desc",
 ):
-    return await spotify_client.get_library_albums(limit=limit, offset=offset)
+    """Saved albums, newest first; ``q`` matches album or artist names."""
+    tree = projection.select(fields, "library_albums")
+    filtered = bool(q or artist) or sort != "added_at" or order != "desc"
+    if _use_mirror(tree, filtered):
+        from src.services.library import library_mirror
+
+        albums = await library_mirror.search(
+            spotify_client, "albums", q=q, artist=artist, sort=sort, order=order,
+            limit=limit, offset=offset,
+        )
+    else:
+        albums = await spotify_client.get_library_albums(
+            limit=limit, offset=offset, market=_market_for(tree)
+        )
+    return json_response(projection.project(albums, tree))
 
 
 @app.get("/follow/artists")
@@ -202,7 +349,7 @@ async def followed_artists(
     limit: int = 50,
     after: str | None = None,
 ):
-    return await spotify_client.get_followed_artists(limit=limit, after=after)
+    return json_response(await spotify_client.get_followed_artists(limit=limit, after=after))
 
 
 @app.put("/follow/artists/{artist_id}")
@@ -229,8 +376,17 @@ async def search(
     q: str,
     type: str = "track,artist,album",
     limit: int = 10,
+    fields: str | None = None,
 ):
-    return await spotify_client.search(q, type=type, limit=limit)
+    """Search the catalog; ``fields`` selects the attributes of each item."""
+    tree = projection.select(fields, "search")
+    result = await spotify_client.search(q, type=type, limit=limit, market=_market_for(tree))
+    if tree is None:
+        return json_response(result)
+    return json_response({
+        kind: {"items": projection.project(page.get("items", []), tree), "total": page.get("total")}
+        for kind, page in result.items()
+    })
 
 
 @app.get("/recommend")
@@ -241,16 +397,18 @@ async def recommend(
     seed_genres: str = "",
     limit: int = 20,
 ):
-    return await spotify_client.recommendations(
+    return json_response(await spotify_client.recommendations(
         seed_tracks=seed_tracks,
         seed_artists=seed_artists,
         seed_genres=seed_genres,
         limit=limit,
-    )
+    ))
 
 
 @app.get("/profile")
 async def profile(
     spotify_client: Annotated[SpotifyClient, Depends(get_redis_spotify_client)],
+    fields: str | None = None,
 ):
-    return await spotify_client.get_profile()
+    tree = projection.select(fields, "profile")
+    return json_response(projection.project(await spotify_client.get_profile(), tree))
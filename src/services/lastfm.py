@@ -2,20 +2,50 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import json
 import os
+import time
 from typing import Any, List, Dict
 
-from src.storage import _redis
-from src.utils.http import safe_get
+from src.utils.cache import TwoTierCache
+from src.utils.http import async_get
+from src.utils.ratelimit import TokenBucket
+
+# Shared by every LastFMService instance of the worker.
+_cache = TwoTierCache(
+    maxsize=int(os.getenv("LASTFM_CACHE_SIZE", "1024")),
+    local_ttl=float(os.getenv("LASTFM_LOCAL_TTL", "60")),
+    name="lastfm",
+)
+
+# Scrobble history is fetched and cached in aligned buckets of this many seconds.
+SCROBBLE_BUCKET = 24 * 3600
+SCROBBLE_PAGE_SIZE = 200
+# A bucket is immutable once it ended this long ago (late scrobbles settle).
+SCROBBLE_SETTLE = int(os.getenv("LASTFM_SCROBBLE_SETTLE", "3600"))
+# Cache lifetime of buckets that may still change.
+SCROBBLE_OPEN_TTL = int(os.getenv("LASTFM_SCROBBLE_OPEN_TTL", "300"))
+# Buckets one call may span: each costs at least one paced Last.fm request.
+SCROBBLE_MAX_BUCKETS = int(os.getenv("LASTFM_SCROBBLE_MAX_BUCKETS", "31"))
+# Maximum number of concurrent Last.fm requests per call.
+LASTFM_CONCURRENCY = int(os.getenv("LASTFM_CONCURRENCY", "4"))
+
+# Last.fm allows about five requests per second per API key.
+lastfm_limiter = TokenBucket(
+    rate=float(os.getenv("LASTFM_RATE_LIMIT", "5")),
+    capacity=float(os.getenv("LASTFM_RATE_BURST", "5")),
+)
+
+
 class LastFMService:
     def __init__(self):
         self.api_key = os.getenv("LASTFM_API_KEY")
         self.user = os.getenv("LASTFM_USERNAME")
         self.base = "https://ws.audioscrobbler.com/2.0/"
 
-    def recent_tracks(self, limit: int = 50) -> Dict[str, Any]:
+    async def recent_tracks(self, limit: int = 50) -> Dict[str, Any]:
         if not self.api_key or not self.user:
             return {}
         params = {
@@ -25,50 +55,145 @@ class LastFMService:
             "format": "json",
             "limit": limit,
         }
-        return self._cached(params)
+        return await self._cached(params)
 
     # ------------------------------------------------------------------
-    def _cached(self, params: Dict[str, Any], ttl: int = 21600) -> Dict[str, Any]:
-        """Return cached JSON response for the given parameters."""
-        key = "lastfm:raw:" + hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
-        cached = _redis.get(key)
-        if cached:
-            return json.loads(cached)
-        resp = safe_get(self.base, params=params)
-        data = resp.json()
-        try:
-            _redis.set(key, json.dumps(data), ex=ttl)
-        except Exception:
-            pass
-        return data
-
-    def track_tags(self, artist: str, title: str, limit: int = 5) -> List[str]:
-        """Return top tags for a track using ``track.getTopTags``."""
-        if not self.api_key:
-            return []
-        params = {
+    async def _get(self, params: Dict[str, Any]):
+        """Call the API, paced by ``lastfm_limiter``."""
+        await lastfm_limiter.acquire()
+        return await async_get(
+            self.base, params=params, deadline=20, service="lastfm", endpoint=params["method"]
+        )
+
+    @staticmethod
+    def _cache_key(params: Dict[str, Any]) -> str:
+        return "lastfm:raw:" + hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    async def _cached(self, params: Dict[str, Any], ttl: int = 21600) -> Dict[str, Any]:
+        """Return cached JSON response for the given parameters.
+
+        Responses are kept in process for ``LASTFM_LOCAL_TTL`` seconds and in
+        Redis for ``ttl``; see :class:`~src.utils.cache.TwoTierCache`.
+        """
+        return await _cache.get(self._cache_key(params), self._loader(params), ttl)
+
+    def _loader(self, params: Dict[str, Any]):
+        async def load() -> Dict[str, Any]:
+            resp = await self._get(params)
+            return resp.json()
+
+        return load
+
+    def _tags_params(self, artist: str, title: str) -> Dict[str, Any]:
+        return {
             "method": "track.getTopTags",
             "artist": artist,
             "track": title,
             "api_key": self.api_key,
             "format": "json",
         }
-        data = self._cached(params)
+
+    @staticmethod
+    def _top_tags(data: Dict[str, Any], limit: int) -> List[str]:
         tags = data.get("toptags", {}).get("tag", [])
+        if isinstance(tags, dict):
+            tags = [tags]
         return [t.get("name") for t in tags[:limit] if isinstance(t, dict)]
 
-    def scrobble_history(self, from_ts: int, to_ts: int) -> List[Dict[str, Any]]:
-        """Return listening history between two timestamps."""
+    async def track_tags(self, artist: str, title: str, limit: int = 5) -> List[str]:
+        """Return top tags for a track using ``track.getTopTags``."""
+        if not self.api_key:
+            return []
+        data = await self._cached(self._tags_params(artist, title))
+        return self._top_tags(data, limit)
+
+    async def track_tags_batch(
+        self, tracks: List[tuple[str, str]], limit: int = 5, ttl: int = 21600
+    ) -> List[List[str]]:
+        """Return top tags for several ``(artist, title)`` pairs, in input order.
+
+        Cached responses are looked up in one round trip; the rest are fetched
+        concurrently, paced by ``lastfm_limiter``, and cached like
+        :meth:`track_tags` results.  Tracks whose lookup failed get no tags.
+        """
+        if not self.api_key:
+            return [[] for _ in tracks]
+        items = []
+        for artist, title in tracks:
+            params = self._tags_params(artist, title)
+            items.append((self._cache_key(params), self._loader(params)))
+        results = await _cache.get_many(items, ttl)
+        return [
+            [] if isinstance(data, BaseException) else self._top_tags(data, limit)
+            for data in results
+        ]
+
+    async def scrobble_history(self, from_ts: int, to_ts: int) -> List[Dict[str, Any]]:
+        """Return listening history between two timestamps, newest first.
+
+        The range is split into UTC-aligned ``SCROBBLE_BUCKET`` windows that are
+        fetched concurrently and cached individually: buckets that ended more
+        than ``SCROBBLE_SETTLE`` seconds ago never change and are cached
+        without expiry, so overlapping ranges only refetch the open bucket.
+        Ranges spanning more than ``SCROBBLE_MAX_BUCKETS`` buckets raise
+        ``ValueError``.
+        """
         if not self.api_key or not self.user:
             return []
-        params = {
-            "method": "user.getrecenttracks",
-            "user": self.user,
-            "api_key": self.api_key,
-            "format": "json",
-            "from": int(from_ts),
-            "to": int(to_ts),
-            "limit": 200,
-        }
-        data = self._cached(params)
-        return data.get("recenttracks", {}).get("track", [])
+        from_ts, to_ts = int(from_ts), int(to_ts)
+        now = int(time.time())
+        starts = range(from_ts - from_ts % SCROBBLE_BUCKET, min(to_ts, now) + 1, SCROBBLE_BUCKET)
+        if len(starts) > SCROBBLE_MAX_BUCKETS:
+            raise ValueError(
+                f"range spans {len(starts)} days, at most {SCROBBLE_MAX_BUCKETS} allowed"
+            )
+        semaphore = asyncio.Semaphore(LASTFM_CONCURRENCY)
+        buckets = await asyncio.gather(
+            *(self._scrobble_bucket(start, now, semaphore) for start in starts)
+        )
+        return [
+            track
+            for bucket in reversed(buckets)
+            for track in bucket
+            if from_ts <= int(track["date"]["uts"]) <= to_ts
+        ]
+
+    async def _scrobble_bucket(
+        self, start: int, now: int, semaphore: asyncio.Semaphore
+    ) -> List[Dict[str, Any]]:
+        end = start + SCROBBLE_BUCKET - 1
+        ttl = None if end < now - SCROBBLE_SETTLE else SCROBBLE_OPEN_TTL
+        key = f"lastfm:scrobbles:{self.user}:{SCROBBLE_BUCKET}:{start}"
+        return await _cache.get(key, lambda: self._fetch_scrobbles(start, end, semaphore), ttl)
+
+    async def _fetch_scrobbles(
+        self, start: int, end: int, semaphore: asyncio.Semaphore
+    ) -> List[Dict[str, Any]]:
+        """Fetch every page of scrobbles in ``[start, end]``."""
+
+        async def page(number: int) -> Dict[str, Any]:
+            params = {
+                "method": "user.getrecenttracks",
+                "user": self.user,
+                "api_key": self.api_key,
+                "format": "json",
+                "from": start,
+                "to": end,
+                "limit": SCROBBLE_PAGE_SIZE,
+                "page": number,
+            }
+            async with semaphore:
+                resp = await self._get(params)
+            resp.raise_for_status()
+            return resp.json().get("recenttracks", {})
+
+        first = await page(1)
+        total_pages = int(first.get("@attr", {}).get("totalPages") or 1)
+        rest = await asyncio.gather(*(page(n) for n in range(2, total_pages + 1)))
+        tracks = []
+        for data in (first, *rest):
+            items = data.get("track", [])
+            # Last.fm returns a bare object instead of a list for single results.
+            tracks.extend([items] if isinstance(items, dict) else items)
+        # The currently playing track has no date and belongs to no bucket.
+        return [track for track in tracks if "date" in track]
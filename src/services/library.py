@@ -0,0 +1,305 @@
+"""Local SQLite mirror of the user's saved tracks and albums.
+
+The library endpoints query the mirror instead of proxying one Spotify page
+per call.  A sync walks ``/me/tracks`` or ``/me/albums`` newest first and
+stops at the newest ``added_at`` already mirrored (the watermark), so keeping
+the mirror current usually costs a single page.  Removals do not show up in
+that walk; when Spotify's ``total`` disagrees with the mirror after a sync,
+the kind is mirrored again in full in the background while the current
+mirror keeps being served.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from src.utils import fuzzy
+from src.utils.singleflight import SingleFlight
+
+LIBRARY_DB = os.getenv(
+    "LIBRARY_DB", os.path.join(tempfile.gettempdir(), "spotigen-library.sqlite3")
+)
+# Age in seconds after which a query first syncs the mirror with Spotify.
+LIBRARY_SYNC_INTERVAL = int(os.getenv("LIBRARY_SYNC_INTERVAL", "300"))
+LIBRARY_MIRROR = os.getenv("LIBRARY_MIRROR", "1").lower() in ("1", "true", "yes")
+PAGE_SIZE = 50
+
+# kind (Spotify library endpoint) -> key of the saved object in each item
+KINDS = {"tracks": "track", "albums": "album"}
+SORT_COLUMNS = {
+    "tracks": ("added_at", "name", "artist", "album", "duration_ms"),
+    "albums": ("added_at", "name", "artist", "release_date"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS library (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    added_at TEXT NOT NULL,
+    name TEXT,
+    artist TEXT,
+    album TEXT,
+    duration_ms INTEGER,
+    release_date TEXT,
+    artists_search TEXT,
+    search TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, kind, uri)
+);
+CREATE INDEX IF NOT EXISTS library_added_at ON library (user_id, kind, added_at);
+CREATE TABLE IF NOT EXISTS library_sync (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    watermark TEXT,
+    synced_at REAL NOT NULL,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, kind)
+);
+"""
+
+
+def _like(text: str) -> str:
+    escaped = text.casefold().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _row(user_id: str, kind: str, item: dict) -> tuple | None:
+    obj = item.get(KINDS[kind])
+    if not obj or not obj.get("uri"):
+        return None
+    artists = [a.get("name") or "" for a in obj.get("artists") or []]
+    album = (obj.get("album") or {}).get("name") if kind == "tracks" else obj.get("name")
+    return (
+        user_id,
+        kind,
+        obj["uri"],
+        item.get("added_at") or "",
+        obj.get("name"),
+        artists[0] if artists else None,
+        album,
+        obj.get("duration_ms"),
+        obj.get("release_date"),
+        " ".join(artists).casefold(),
+        " ".join([obj.get("name") or "", *artists, album or ""]).casefold(),
+        json.dumps(item),
+    )
+
+
+def _index_tracks(user_id: str, kind: str, items: list[dict]):
+    """Feed synced tracks to the user's fuzzy title index."""
+    if kind != "tracks":
+        return
+    fuzzy.track_indexes.add_tracks(
+        user_id,
+        (
+            (
+                (item.get("track") or {}).get("uri"),
+                (item.get("track") or {}).get("name"),
+                [a.get("name") or "" for a in (item.get("track") or {}).get("artists") or []],
+            )
+            for item in items
+        ),
+    )
+
+
+class LibraryMirror:
+    """Saved library of every user, mirrored into one SQLite database."""
+
+    def __init__(self, path: str = LIBRARY_DB):
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+        # The connection is shared by the worker threads running queries.
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        # (user id, kind) -> full resync running in the background.
+        self._resyncs: dict[tuple[str, str], asyncio.Task] = {}
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(library_sync)")}
+            if "skipped" not in columns:  # mirrors created before skipped entries were counted
+                self._db.execute(
+                    "ALTER TABLE library_sync ADD COLUMN skipped INTEGER NOT NULL DEFAULT 0"
+                )
+        return self._db
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # ------------------------------------------------------------------
+    def state(self, user_id: str, kind: str) -> tuple[str | None, float] | None:
+        """Return ``(watermark, synced_at)`` of the last sync, if any."""
+        with self._lock:
+            return self._conn().execute(
+                "SELECT watermark, synced_at FROM library_sync WHERE user_id = ? AND kind = ?",
+                (user_id, kind),
+            ).fetchone()
+
+    def count(self, user_id: str, kind: str) -> int:
+        with self._lock:
+            return self._conn().execute(
+                "SELECT COUNT(*) FROM library WHERE user_id = ? AND kind = ?", (user_id, kind)
+            ).fetchone()[0]
+
+    def size(self, user_id: str, kind: str) -> int:
+        """Return the mirrored items plus the entries skipped as unplayable."""
+        with self._lock:
+            return self._conn().execute(
+                "SELECT (SELECT COUNT(*) FROM library WHERE user_id = ? AND kind = ?)"
+                " + COALESCE((SELECT skipped FROM library_sync WHERE user_id = ? AND kind = ?), 0)",
+                (user_id, kind, user_id, kind),
+            ).fetchone()[0]
+
+    def store(self, user_id: str, kind: str, items: list[dict], replace: bool = False):
+        """Upsert ``items``; ``replace`` drops the previous mirror of ``kind`` first.
+
+        Items without a playable object (local files, removed releases) are
+        not mirrored but counted, so that they match Spotify's ``total``.
+        """
+        rows = [row for row in (_row(user_id, kind, item) for item in items) if row]
+        skipped = len(items) - len(rows)
+        # Skipped entries move the watermark too, or every sync would see them as new.
+        marks = [item.get("added_at") or "" for item in items]
+        with self._lock:
+            db = self._conn()
+            with db:
+                if replace:
+                    db.execute(
+                        "DELETE FROM library WHERE user_id = ? AND kind = ?", (user_id, kind)
+                    )
+                else:
+                    previous = db.execute(
+                        "SELECT watermark, skipped FROM library_sync WHERE user_id = ? AND kind = ?",
+                        (user_id, kind),
+                    ).fetchone()
+                    if previous:
+                        marks.append(previous[0] or "")
+                        skipped += previous[1]
+                db.executemany(
+                    "INSERT OR REPLACE INTO library VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                marks.append(db.execute(
+                    "SELECT MAX(added_at) FROM library WHERE user_id = ? AND kind = ?",
+                    (user_id, kind),
+                ).fetchone()[0] or "")
+                watermark = max(marks) or None
+                db.execute(
+                    "INSERT OR REPLACE INTO library_sync VALUES (?, ?, ?, ?, ?)",
+                    (user_id, kind, watermark, time.time(), skipped),
+                )
+
+    def query(
+        self,
+        user_id: str,
+        kind: str,
+        q: str | None = None,
+        artist: str | None = None,
+        sort: str = "added_at",
+        order: str = "desc",
+        limit: int | None = 50,
+        offset: int = 0,
+    ) -> list[dict]:
+        """Return mirrored items matching ``q`` and ``artist``, sorted and paginated."""
+        if sort not in SORT_COLUMNS[kind]:
+            raise ValueError(f"cannot sort {kind} by {sort!r}")
+        direction = "ASC" if order == "asc" else "DESC"
+        sql = "SELECT data FROM library WHERE user_id = ? AND kind = ?"
+        args: list = [user_id, kind]
+        if q:
+            sql += " AND search LIKE ? ESCAPE '\\'"
+            args.append(_like(q))
+        if artist:
+            sql += " AND artists_search LIKE ? ESCAPE '\\'"
+            args.append(_like(artist))
+        sql += f" ORDER BY {sort} {direction}, uri LIMIT ? OFFSET ?"
+        args += [-1 if limit is None else limit, offset]
+        with self._lock:
+            rows = self._conn().execute(sql, args).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    # ------------------------------------------------------------------
+    async def sync(self, client, user_id: str, kind: str) -> int:
+        """Bring the mirror of ``kind`` up to date; return the items fetched.
+
+        Only the first sync of ``kind`` mirrors it in full before returning;
+        later full resyncs (after removals) run in the background.
+        """
+        state = await asyncio.to_thread(self.state, user_id, kind)
+        watermark = state[0] if state else None
+        if watermark is None:
+            return await self._full_sync(client, user_id, kind)
+
+        fresh: list[dict] = []
+        offset, total = 0, None
+        while True:
+            page = await client.get_library_page(
+                kind, PAGE_SIZE, offset, market="from_token"
+            )
+            items = page.get("items", [])
+            total = page.get("total", total)
+            # Items equal to the watermark may be new (same second): upsert them.
+            # Skipped ones there were already counted.
+            new = [
+                item for item in items
+                if (item.get("added_at") or "") > watermark
+                or ((item.get("added_at") or "") == watermark and _row(user_id, kind, item))
+            ]
+            fresh.extend(new)
+            offset += len(items)
+            if len(new) < len(items) or not items or not page.get("next"):
+                break
+        await asyncio.to_thread(self.store, user_id, kind, fresh)
+        _index_tracks(user_id, kind, fresh)
+        if total is not None and await asyncio.to_thread(self.size, user_id, kind) != total:
+            # Something was removed from the library: mirror it again.
+            self._schedule_resync(client, user_id, kind)
+        return len(fresh)
+
+    def _schedule_resync(self, client, user_id: str, kind: str):
+        key = (user_id, kind)
+        if key in self._resyncs:
+            return
+        task = asyncio.create_task(self._full_sync(client, user_id, kind))
+        self._resyncs[key] = task
+
+        def done(task: asyncio.Task):
+            self._resyncs.pop(key, None)
+            if not task.cancelled():
+                task.exception()
+
+        task.add_done_callback(done)
+
+    async def _full_sync(self, client, user_id: str, kind: str) -> int:
+        items = await client.get_library(kind, limit=None, market="from_token")
+        await asyncio.to_thread(self.store, user_id, kind, items, True)
+        _index_tracks(user_id, kind, items)
+        return len(items)
+
+    async def ensure_synced(self, client, kind: str, max_age: float | None = None) -> str:
+        """Sync ``kind`` unless it was synced within ``max_age``; return the user id."""
+        user_id = await client.get_my_user_id()
+        state = await asyncio.to_thread(self.state, user_id, kind)
+        max_age = LIBRARY_SYNC_INTERVAL if max_age is None else max_age
+        if state is None or time.time() - state[1] >= max_age:
+            await self._flight.do((user_id, kind), lambda: self.sync(client, user_id, kind))
+        return user_id
+
+    async def search(self, client, kind: str, **query) -> list[dict]:
+        """Sync if needed, then run :meth:`query` for the client's user."""
+        user_id = await self.ensure_synced(client, kind)
+        return await asyncio.to_thread(self.query, user_id, kind, **query)
+
+
+library_mirror = LibraryMirror()
@@ -1,46 +1,228 @@
 """Minimal MusicBrainz helper to fetch original release year."""
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import json
-from typing import Optional
+import os
+from collections import OrderedDict, deque
+from typing import Iterable, List, Optional, Tuple
 
-from src.storage import _redis
-from src.utils.http import safe_get
+from src import storage
+from src.utils import metrics
+from src.utils.http import async_get
+from src.utils.ratelimit import TokenBucket
+
+# MusicBrainz allows one request per second per client; every lookup of the
+# process is queued behind this bucket.
+musicbrainz_limiter = TokenBucket(
+    rate=float(os.getenv("MUSICBRAINZ_RATE_LIMIT", "1")),
+    capacity=1,
+)
+# Artist/recording pairs combined into one search query.
+MUSICBRAINZ_BATCH_SIZE = int(os.getenv("MUSICBRAINZ_BATCH_SIZE", "10"))
+MUSICBRAINZ_TTL = 172800
+# Recordings MusicBrainz does not know are looked up again after this long.
+MUSICBRAINZ_MISS_TTL = int(os.getenv("MUSICBRAINZ_MISS_TTL", "86400"))
+_NO_MATCH = "-"
+# Returned by a lookup MusicBrainz did not answer; such results are not cached.
+_FAILED = object()
+
+# Cache lookups feeding the queue, referenced until done so they are not collected.
+_BACKGROUND_TASKS: set[asyncio.Task] = set()
+
+Pair = Tuple[str, str]
+
+
+def _quote(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _query(artist: str, title: str) -> str:
+    return f"artist:{_quote(artist)} AND recording:{_quote(title)}"
+
+
+def _year(date: Optional[str]) -> Optional[int]:
+    if not date:
+        return None
+    try:
+        return int(date.split("-")[0])
+    except ValueError:
+        return None
+
+
+def _earliest(recordings: Iterable[dict]) -> Optional[int]:
+    years = [
+        year
+        for rec in recordings
+        for rel in rec.get("releases", [])
+        if (year := _year(rel.get("date"))) is not None
+    ]
+    return min(years) if years else None
+
+
+def _matches(rec: dict, artist: str, title: str) -> bool:
+    if rec.get("title", "").casefold() != title.casefold():
+        return False
+    names = {
+        name.casefold()
+        for credit in rec.get("artist-credit", [])
+        for name in (credit.get("name"), credit.get("artist", {}).get("name"))
+        if name
+    }
+    return artist.casefold() in names
+
+
+class _ReleaseYearBatcher:
+    """Process-wide queue of pending lookups, drained by a single worker.
+
+    Pending pairs are combined into one Lucene ``OR`` query per request; pairs
+    the combined search does not match are retried on their own, since a
+    single query is more lenient than the exact matching applied to batches.
+    """
+
+    def __init__(self):
+        self._pending: OrderedDict[Pair, List[asyncio.Future]] = OrderedDict()
+        self._singles: deque[Tuple[Pair, List[asyncio.Future]]] = deque()
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, pair: Pair) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and self._worker.get_loop() is not loop:
+            # Left over from a previous event loop; its futures are unreachable.
+            self._pending.clear()
+            self._singles.clear()
+            self._worker = None
+        future = loop.create_future()
+        self._pending.setdefault(pair, []).append(future)
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        return future
+
+    async def _run(self):
+        while self._pending or self._singles:
+            if self._singles:
+                batch = [self._singles.popleft()]
+            else:
+                size = min(MUSICBRAINZ_BATCH_SIZE, len(self._pending))
+                batch = [self._pending.popitem(last=False) for _ in range(size)]
+            try:
+                years = await self._lookup([pair for pair, _ in batch])
+            except Exception as exc:
+                for _, futures in batch:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(exc)
+                continue
+            hits, misses, done = {}, {}, []
+            for (pair, futures), year in zip(batch, years):
+                if year is None and len(batch) > 1:
+                    self._singles.append((pair, futures))
+                    continue
+                if year is not _FAILED:
+                    key = MusicBrainz._cache_key(*pair)
+                    if year is None:
+                        misses[key] = _NO_MATCH
+                    else:
+                        hits[key] = str(year)
+                done.append((futures, None if year is _FAILED else year))
+            # Cache before resolving: waiters may shut the loop down right after.
+            try:
+                if hits:
+                    await storage.amset(hits, ex=MUSICBRAINZ_TTL)
+                if misses:
+                    await storage.amset(misses, ex=MUSICBRAINZ_MISS_TTL)
+            except Exception:
+                pass
+            for futures, year in done:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(year)
+
+    async def _lookup(self, pairs: List[Pair]) -> list:
+        """Return the earliest year per pair, or ``_FAILED`` for each pair."""
+        await musicbrainz_limiter.acquire()
+        if len(pairs) == 1:
+            query, limit = _query(*pairs[0]), 1
+        else:
+            query, limit = " OR ".join(f"({_query(*pair)})" for pair in pairs), 100
+        params = {"query": query, "fmt": "json", "inc": "releases", "limit": limit}
+        resp = await async_get(
+            MusicBrainz.base + "recording",
+            params=params,
+            headers={"User-Agent": "spotigen"},
+            deadline=20,
+            service="musicbrainz",
+            endpoint="recording",
+        )
+        if resp.status_code != 200:
+            return [_FAILED] * len(pairs)
+        recordings = resp.json().get("recordings", [])
+        if len(pairs) == 1:
+            return [_earliest(recordings)]
+        return [
+            _earliest(rec for rec in recordings if _matches(rec, artist, title))
+            for artist, title in pairs
+        ]
+
+
+_batcher = _ReleaseYearBatcher()
 
 
 class MusicBrainz:
     base = "https://musicbrainz.org/ws/2/"
 
-    def _cache_key(self, artist: str, title: str) -> str:
+    @staticmethod
+    def _cache_key(artist: str, title: str) -> str:
         data = json.dumps({"a": artist, "t": title}, sort_keys=True)
         return "mb:recording:" + hashlib.sha1(data.encode()).hexdigest()
 
-    def first_release_year(self, artist: str, title: str) -> Optional[int]:
-        """Return the earliest release year for ``artist`` and ``title``."""
-        key = self._cache_key(artist, title)
-        cached = _redis.get(key)
-        if cached:
-            return int(cached)
-        query = f'artist:"{artist}" AND recording:"{title}"'
-        params = {"query": query, "fmt": "json", "inc": "releases", "limit": 1}
-        resp = safe_get(self.base + "recording", params=params, headers={"User-Agent": "spotigen"})
-        if resp.status_code != 200:
-            return None
-        data = resp.json()
-        years = []
-        for rec in data.get("recordings", []):
-            for rel in rec.get("releases", []):
-                date = rel.get("date")
-                if date:
-                    try:
-                        years.append(int(date.split("-")[0]))
-                    except ValueError:
-                        pass
-        year = min(years) if years else None
-        if year is not None:
+    def release_year_futures(self, pairs: List[Pair]) -> List[asyncio.Future]:
+        """Return one future per ``(artist, title)`` pair resolving to its year.
+
+        Cached years (and cached misses) are read in one round trip; the rest
+        join the process-wide queue, which combines them into batched searches
+        paced by ``musicbrainz_limiter``.
+        """
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in pairs]
+
+        def forward(target: asyncio.Future, source: asyncio.Future):
+            if target.done():
+                return
+            if source.cancelled():
+                target.cancel()
+            elif source.exception() is not None:
+                target.set_exception(source.exception())
+            else:
+                target.set_result(source.result())
+
+        async def resolve():
             try:
-                _redis.set(key, str(year), ex=172800)
+                cached = await storage.amget([self._cache_key(*pair) for pair in pairs])
             except Exception:
-                pass
+                cached = [None] * len(pairs)
+            hits = sum(1 for value in cached if value)
+            metrics.count_cache("musicbrainz", hits=hits, misses=len(pairs) - hits)
+            for pair, future, value in zip(pairs, futures, cached):
+                if value:
+                    future.set_result(None if value == _NO_MATCH else int(value))
+                else:
+                    _batcher.submit(pair).add_done_callback(
+                        lambda source, target=future: forward(target, source)
+                    )
+
+        task = loop.create_task(resolve())
+        _BACKGROUND_TASKS.add(task)
+        task.add_done_callback(_BACKGROUND_TASKS.discard)
+        return futures
+
+    async def release_years(self, pairs: List[Pair]) -> List[Optional[int]]:
+        """Return the earliest release year of every pair, in input order."""
+        return list(await asyncio.gather(*self.release_year_futures(pairs)))
+
+    async def first_release_year(self, artist: str, title: str) -> Optional[int]:
+        """Return the earliest release year for ``artist`` and ``title``."""
+        (year,) = await self.release_years([(artist, title)])
         return year
@@ -1,9 +1,64 @@
+import asyncio
 import json
+import math
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
 
 import httpx
 from fastapi import HTTPException
 
+from src import storage
 from src.dtos.api import TrackTitles, TrackURIs
+from src.utils import fuzzy, metrics
+from src.utils.http import client_session, retry_after
+from src.utils.ratelimit import TokenBucket
+from src.utils.singleflight import InlineSingleFlight
+
+# Process-wide pacing of every Spotify Web API call.
+spotify_limiter = TokenBucket(
+    rate=float(os.getenv("SPOTIFY_RATE_LIMIT", "10")),
+    capacity=float(os.getenv("SPOTIFY_RATE_BURST", "20")),
+)
+# How often a call throttled with ``429`` is queued again, and the longest
+# ``Retry-After`` we are willing to wait for instead of failing the request.
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "3"))
+SPOTIFY_MAX_RETRY_AFTER = float(os.getenv("SPOTIFY_MAX_RETRY_AFTER", "30"))
+# Maximum number of concurrent ``/search`` calls when resolving track titles.
+SEARCH_CONCURRENCY = int(os.getenv("SPOTIFY_SEARCH_CONCURRENCY", "8"))
+# Spotify accepts at most 100 URIs per "add items to playlist" request.
+ADD_TRACKS_BATCH = 100
+# Maximum number of pages fetched in parallel by ``SpotifyClient._iter_pages``.
+PAGE_CONCURRENCY = int(os.getenv("SPOTIFY_PAGE_CONCURRENCY", "4"))
+# Only the attributes projected by ``get_tracks_from_playlist`` are requested.
+PLAYLIST_TRACK_FIELDS = (
+    "total,next,items(track(name,uri,album(name),"
+    "artists(name,id,uri,href,external_urls),duration_ms,explicit))"
+)
+# Artist attributes kept in projected tracks, matching ``PLAYLIST_TRACK_FIELDS``.
+ARTIST_FIELDS = ("name", "id", "uri", "href", "external_urls")
+# Age in seconds after which a cached playlist index is refreshed in the background.
+PLAYLIST_INDEX_REFRESH = int(os.getenv("PLAYLIST_INDEX_REFRESH", "300"))
+# Seconds a successful GET of these very hot endpoints is reused per token
+# after it completed; other GETs are only shared while in flight.
+RESULT_WINDOWS = {
+    "/v1/me/player/currently-playing": float(os.getenv("SPOTIFY_NOW_PLAYING_WINDOW", "1")),
+}
+
+# access token -> Spotify user id, so each request does not need a ``/me`` call.
+_USER_IDS: OrderedDict[str, str] = OrderedDict()
+_USER_IDS_MAX = 1024
+# User ids whose playlist index is being rebuilt, and the tasks doing it.
+_INDEX_REFRESHING: set[str] = set()
+# user id -> (playlist list fingerprint, exact name map, trigram index)
+_PLAYLIST_MATCHERS: OrderedDict[str, tuple] = OrderedDict()
+# Identical GETs (same token and URL) in flight share one upstream call.
+_GETS = InlineSingleFlight()
+# GET key -> (expiry, response) of GETs served within ``RESULT_WINDOWS``.
+_RECENT_GETS: dict[tuple, tuple[float, httpx.Response]] = {}
+_RECENT_GETS_MAX = 1024
+_BACKGROUND_TASKS: set[asyncio.Task] = set()
 
 
 class InvalidAccessToken(Exception):
@@ -15,10 +70,104 @@ class SpotifyAPIError(Exception):
 
 
 class SpotifyClient:
-    def __init__(self, access_token):
+    def __init__(self, access_token, http_client: httpx.AsyncClient | None = None):
         self.access_token = access_token
         self.base_url = "https://api.spotify.com/v1"
         self._user_id = None
+        self._http_client = http_client
+
+    def _session(self):
+        """Return a context manager yielding the pooled client when injected."""
+        return client_session(self._http_client)
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send an authenticated request, coalescing identical GETs.
+
+        Concurrent GETs of the same URL and parameters with the same token
+        share one upstream call and its response.  GETs of an endpoint listed
+        in ``RESULT_WINDOWS`` also reuse a successful response that completed
+        within its window.
+        """
+        if method != "GET":
+            return await self._send(method, url, **kwargs)
+        params = kwargs.get("params") or {}
+        key = (self.access_token, url, tuple(sorted((k, str(v)) for k, v in params.items())))
+        window = RESULT_WINDOWS.get(urlsplit(url).path, 0)
+        if window > 0:
+            recent = _RECENT_GETS.pop(key, None)
+            if recent is not None and recent[0] > time.monotonic():
+                _RECENT_GETS[key] = recent
+                metrics.count_cache("spotify_get", hits=1)
+                return recent[1]
+        joined = _GETS.in_flight(key)
+        metrics.count_cache("spotify_get", hits=joined, misses=not joined)
+        response = await _GETS.do(key, lambda: self._send(method, url, **kwargs))
+        if window > 0 and response.status_code < 400 and not joined:
+            _RECENT_GETS[key] = (time.monotonic() + window, response)
+            while len(_RECENT_GETS) > _RECENT_GETS_MAX:
+                del _RECENT_GETS[next(iter(_RECENT_GETS))]
+        return response
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send an authenticated request paced by ``spotify_limiter``.
+
+        A ``429`` pauses the shared limiter for the ``Retry-After`` delay and
+        the call is queued again, up to ``SPOTIFY_MAX_RETRIES`` times.  Calls
+        are held for at most ``SPOTIFY_MAX_RETRY_AFTER``; while a longer
+        ``Retry-After`` is pending, they fail at once with a ``429``.
+        """
+        attempt = 0
+        while True:
+            remaining = spotify_limiter.paused_for()
+            if remaining > SPOTIFY_MAX_RETRY_AFTER:
+                raise HTTPException(
+                    status_code=429,
+                    detail="Spotify rate limit exceeded",
+                    headers={"Retry-After": str(math.ceil(remaining))},
+                )
+            await spotify_limiter.acquire()
+            started = time.perf_counter()
+            status = "error"
+            try:
+                async with self._session() as client:
+                    if method == "DELETE" and "json" in kwargs:
+                        # ``AsyncClient.delete`` takes no body.
+                        response = await client.request(
+                            method, url, headers=self._auth_headers(), **kwargs
+                        )
+                    else:
+                        send = getattr(client, method.lower())
+                        response = await send(url, headers=self._auth_headers(), **kwargs)
+                status = response.status_code
+            finally:
+                metrics.observe_upstream(
+                    "spotify", f"{method} {metrics.endpoint_template(urlsplit(url).path)}", status, started
+                )
+            if response.status_code != 429 or attempt >= SPOTIFY_MAX_RETRIES:
+                return response
+            delay = retry_after(response)
+            delay = 1.0 if delay is None else delay
+            spotify_limiter.pause(delay, max_hold=SPOTIFY_MAX_RETRY_AFTER)
+            if delay > SPOTIFY_MAX_RETRY_AFTER:
+                return response
+            attempt += 1
+
+    def known_user_id(self) -> str | None:
+        """Return the user id if known without a ``/me`` request."""
+        return self._user_id or _USER_IDS.get(self.access_token)
+
+    def _index_tracks(self, tracks: list[dict]):
+        """Add projected tracks to the user's fuzzy title index."""
+        user_id = self.known_user_id()
+        if user_id is None:
+            return
+        fuzzy.track_indexes.add_tracks(
+            user_id,
+            (
+                (t["track_uri"], t["title"], [a.get("name") for a in t.get("artists") or []])
+                for t in tracks
+            ),
+        )
 
     def _auth_headers(self):
         return {
@@ -29,24 +178,26 @@ class SpotifyClient:
     async def get_my_user_id(self):
         if self._user_id is not None:
             return self._user_id
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/me", headers=self._auth_headers()
-            )
+        if self.access_token in _USER_IDS:
+            metrics.count_cache("user_id", hits=1)
+            self._user_id = _USER_IDS[self.access_token]
+            return self._user_id
+        metrics.count_cache("user_id", misses=1)
+        response = await self._request("GET", f"{self.base_url}/me")
         if response.status_code != 200:
             raise HTTPException(
                 status_code=401, detail="Invalid or missing access token"
             )
         user_data = response.json()
         self._user_id = user_data["id"]
+        _USER_IDS[self.access_token] = self._user_id
+        if len(_USER_IDS) > _USER_IDS_MAX:
+            _USER_IDS.popitem(last=False)
         return self._user_id
 
     async def search_track(self, query: str, limit=10):
         params = {"q": query, "type": "track", "limit": limit}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/search", headers=self._auth_headers(), params=params
-            )
+        response = await self._request("GET", f"{self.base_url}/search", params=params)
         if response.status_code >= 400:
             raise HTTPException(
                 status_code=response.status_code,
@@ -54,85 +205,236 @@ class SpotifyClient:
             )
         return response.json()["tracks"]["items"]
 
-    async def get_user_playlists(self):
-        playlists = []
-        offset = 0
-        limit = 50
-        user_id = await self.get_my_user_id()
-        url = f"{self.base_url}/users/{user_id}/playlists?limit={limit}&offset={offset}"
-        content = {"next": url}
-        while len(playlists) < 500 and content["next"]:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    content["next"], headers=self._auth_headers()
-                )
-            if response.status_code >= 400:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to get user playlists. Error: {response.text}",
+    async def _fetch_page(self, url: str, params: dict | None = None) -> dict:
+        response = await self._request("GET", url, params=params)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+
+    async def _iter_pages(
+        self,
+        url: str,
+        params: dict | None = None,
+        page_size: int = 50,
+        offset: int = 0,
+        max_items: int | None = None,
+    ):
+        """Yield the items of an offset-paginated endpoint page by page.
+
+        The first page is fetched alone to learn ``total``; the remaining
+        offsets are then requested concurrently (at most ``PAGE_CONCURRENCY``
+        at a time) and yielded in order.  ``max_items`` stops early, and
+        closing the generator cancels the pages still in flight.  Endpoints
+        that do not report ``total`` are followed through their ``next`` link.
+        """
+        if max_items is not None:
+            page_size = max(1, min(page_size, max_items))
+        remaining = max_items
+        first = await self._fetch_page(
+            url, {**(params or {}), "limit": page_size, "offset": offset}
+        )
+        items = first.get("items", [])
+        if remaining is not None:
+            items = items[:remaining]
+            remaining -= len(items)
+        yield items
+
+        total = first.get("total")
+        if total is None:
+            next_url = first.get("next")
+            while next_url and (remaining is None or remaining > 0):
+                page = await self._fetch_page(next_url)
+                items = page.get("items", [])
+                if remaining is not None:
+                    items = items[:remaining]
+                    remaining -= len(items)
+                yield items
+                next_url = page.get("next")
+            return
+
+        end = total if max_items is None else min(total, offset + max_items)
+        semaphore = asyncio.Semaphore(PAGE_CONCURRENCY)
+
+        async def fetch(page_offset: int) -> dict:
+            async with semaphore:
+                return await self._fetch_page(
+                    url, {**(params or {}), "limit": page_size, "offset": page_offset}
                 )
-            content = response.json()
-            for playlist in response.json()["items"]:
-                playlists.append(playlist)
-        return playlists
 
-    async def find_playlist(self, name: str) -> dict | None:
-        playlists = await self.get_user_playlists()
-        for playlist in playlists:
-            if name.lower() in playlist["name"].lower():
-                return playlist
+        tasks = [
+            asyncio.ensure_future(fetch(o))
+            for o in range(offset + page_size, end, page_size)
+        ]
+        try:
+            for task in tasks:
+                items = (await task).get("items", [])
+                if remaining is not None:
+                    items = items[:remaining]
+                    remaining -= len(items)
+                yield items
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _paginate(self, url: str, params: dict | None = None, **kwargs) -> list:
+        """Return every item yielded by :meth:`_iter_pages` as one list."""
+        items = []
+        async for page in self._iter_pages(url, params, **kwargs):
+            items.extend(page)
+        return items
+
+    async def get_user_playlists(self, max_items: int | None = None):
+        user_id = await self.get_my_user_id()
+        return await self._paginate(
+            f"{self.base_url}/users/{user_id}/playlists", max_items=max_items
+        )
+
+    @staticmethod
+    def _index_entry(playlist: dict) -> dict:
+        owner = playlist.get("owner") or {}
+        return {
+            "id": playlist["id"],
+            "name": playlist.get("name", ""),
+            "uri": playlist.get("uri"),
+            "public": playlist.get("public"),
+            "snapshot_id": playlist.get("snapshot_id"),
+            "owner": {"id": owner.get("id"), "display_name": owner.get("display_name")},
+            "tracks": {"total": (playlist.get("tracks") or {}).get("total")},
+        }
 
+    async def _build_playlist_index(self, user_id: str) -> list[dict]:
+        playlists = await self._paginate(f"{self.base_url}/me/playlists")
+        index = [self._index_entry(pl) for pl in playlists]
+        try:
+            await asyncio.to_thread(storage.save_playlist_index, user_id, index)
+        except Exception:
+            pass
+        return index
+
+    def _schedule_index_refresh(self, user_id: str):
+        if user_id in _INDEX_REFRESHING:
+            return
+        _INDEX_REFRESHING.add(user_id)
+        task = asyncio.create_task(self._build_playlist_index(user_id))
+        _BACKGROUND_TASKS.add(task)
+
+        def done(task: asyncio.Task):
+            _BACKGROUND_TASKS.discard(task)
+            _INDEX_REFRESHING.discard(user_id)
+            if not task.cancelled():
+                task.exception()
+
+        task.add_done_callback(done)
+
+    async def _playlist_index(self, refresh: bool = False) -> list[dict]:
+        """Return the user's compact playlist list from the Redis index.
+
+        A missing index (or ``refresh=True``) is rebuilt inline; an index older
+        than ``PLAYLIST_INDEX_REFRESH`` is served as is and rebuilt in the
+        background.
+        """
+        user_id = await self.get_my_user_id()
+        cached = None
+        if not refresh:
+            try:
+                cached = await asyncio.to_thread(storage.load_playlist_index, user_id)
+            except Exception:
+                cached = None
+            metrics.count_cache("playlist_index", hits=cached is not None, misses=cached is None)
+        if cached is None:
+            return await self._build_playlist_index(user_id)
+        if time.time() - cached.get("built_at", 0) > PLAYLIST_INDEX_REFRESH:
+            self._schedule_index_refresh(user_id)
+        return cached["playlists"]
+
+    def _playlist_matcher(self, playlists: list[dict]) -> tuple[dict, fuzzy.TrigramIndex]:
+        """Return the exact-name map and trigram index of ``playlists``.
+
+        Both are kept per user and only rebuilt when the list changes.
+        """
+        user_id = self.known_user_id() or ""
+        fingerprint = hash(tuple((pl["id"], pl["name"]) for pl in playlists))
+        entry = _PLAYLIST_MATCHERS.get(user_id)
+        if entry is None or entry[0] != fingerprint:
+            by_name: dict[str, dict] = {}
+            index = fuzzy.TrigramIndex()
+            for position, playlist in enumerate(playlists):
+                by_name.setdefault(playlist["name"].lower(), playlist)
+                index.add(position, playlist["name"], playlist)
+            entry = _PLAYLIST_MATCHERS[user_id] = (fingerprint, by_name, index)
+            while len(_PLAYLIST_MATCHERS) > fuzzy.FUZZY_MAX_USERS:
+                _PLAYLIST_MATCHERS.popitem(last=False)
+        _PLAYLIST_MATCHERS.move_to_end(user_id)
+        return entry[1], entry[2]
+
+    async def _lookup_playlist(self, name: str, exact: bool) -> dict | None:
+        """Return the indexed playlist called ``name``.
+
+        An exact (case-insensitive) name wins; unless ``exact``, the first
+        playlist containing ``name`` and then the best fuzzy match are tried.
+        Only on a miss is the index rebuilt, in case the playlist was created
+        outside of this plugin since the last refresh.
+        """
+        needle = name.lower()
+        for refresh in (False, True):
+            playlists = await self._playlist_index(refresh=refresh)
+            by_name, index = self._playlist_matcher(playlists)
+            if needle in by_name:
+                return by_name[needle]
+            if exact:
+                continue
+            for playlist in playlists:
+                if needle in playlist["name"].lower():
+                    return playlist
+            playlist = index.best(name)
+            metrics.count_cache("fuzzy_playlists", hits=playlist is not None, misses=playlist is None)
+            if playlist is not None:
+                return playlist
         return None
 
+    async def find_playlist(self, name: str) -> dict | None:
+        """Return the playlist best matching ``name``, tolerating typos."""
+        return await self._lookup_playlist(name, exact=False)
+
     async def playlist_by_name(self, name: str) -> dict:
-        """Return the user's playlist matching ``name`` exactly."""
-        offset = 0
-        limit = 50
-        while True:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{self.base_url}/me/playlists",
-                    headers=self._auth_headers(),
-                    params={"limit": limit, "offset": offset},
-                )
-            if resp.status_code == 404:
-                raise HTTPException(404, "Playlist not found")
-            if resp.status_code != 200:
-                raise HTTPException(401, "Invalid or missing access token")
-            data = resp.json()
-            for pl in data.get("items", []):
-                if pl.get("name", "").lower() == name.lower():
-                    return pl
-            if not data.get("next"):
-                break
-            offset += limit
-        raise HTTPException(404, "Playlist not found")
+        """Return the user's playlist matching ``name`` exactly (any case)."""
+        playlist = await self._lookup_playlist(name, exact=True)
+        if playlist is None:
+            raise HTTPException(404, "Playlist not found")
+        return playlist
 
     async def create_playlist(self, name: str, public: bool):
         data = {"name": name, "public": public}
         user_id = await self.get_my_user_id()
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/users/{user_id}/playlists",
-                headers=self._auth_headers(),
-                json=data,
-            )
+        response = await self._request(
+            "POST",
+            f"{self.base_url}/users/{user_id}/playlists",
+            json=data,
+        )
         if response.status_code >= 400:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Failed to create playlist. Error: {response.text}",
             )
-        return response.json()["id"]
+        playlist = response.json()
+        try:
+            cached = await asyncio.to_thread(storage.load_playlist_index, user_id)
+            if cached is not None:
+                index = [self._index_entry(playlist)] + cached["playlists"]
+                await asyncio.to_thread(
+                    storage.save_playlist_index, user_id, index, cached.get("built_at")
+                )
+        except Exception:
+            pass
+        return playlist["id"]
 
     async def _playlist_id(self, pid_or_name: str) -> str:
         """Return a valid Spotify playlist ID from either a name or ID.
 
         ``pid_or_name`` may already be a playlist ID. If it instead looks like a
-        human readable name, the user's playlists are searched (up to two pages)
-        for an exact case-insensitive match where the playlist owner is the
-        current user.  If still unresolved, a single ``/search`` query is issued
-        and the first result owned by the user is selected.  ``HTTPException``
-        with ``404`` is raised if no match can be found.
+        human readable name, it is looked up in the user's cached playlist
+        index for an exact case-insensitive match.  ``HTTPException`` with
+        ``404`` is raised if no match can be found.
         """
 
         # Spotify IDs are typically 22 alphanumeric characters.
@@ -142,206 +444,376 @@ class SpotifyClient:
         pl = await self.playlist_by_name(pid_or_name)
         return pl["id"]
 
-    async def get_tracks_from_playlist(self, playlist_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/playlists/{playlist_id}/tracks",
-                headers=self._auth_headers(),
-            )
-        if response.status_code >= 400:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to get tracks from playlist. Error: {response.text}",
-            )
+    @staticmethod
+    def _project_track(track: dict) -> dict:
+        return {
+            "title": track["name"],
+            "track_uri": track["uri"],
+            "album_name": track["album"]["name"],
+            "artists": [
+                {key: artist.get(key) for key in ARTIST_FIELDS} for artist in track["artists"]
+            ],
+            "duration_ms": track["duration_ms"],
+            "explicit": track["explicit"],
+        }
+
+    @classmethod
+    def _project_tracks(cls, items: list[dict]) -> list[dict]:
+        return [
+            cls._project_track(track)
+            for track in (item.get("track") for item in items)
+            if track
+        ]
+
+    async def _playlist_snapshot(self, playlist_id: str) -> str | None:
+        data = await self._fetch_page(
+            f"{self.base_url}/playlists/{playlist_id}", {"fields": "snapshot_id"}
+        )
+        return data.get("snapshot_id")
+
+    @staticmethod
+    def _snapshot_of(response: httpx.Response) -> str | None:
+        try:
+            return response.json().get("snapshot_id")
+        except Exception:
+            return None
+
+    async def _cached_playlist_tracks(
+        self, playlist_id: str, snapshot_id: str | None = None
+    ) -> tuple[str, list[dict]] | None:
+        try:
+            return await asyncio.to_thread(storage.load_playlist_tracks, playlist_id, snapshot_id)
+        except Exception:
+            return None
+
+    async def _edit_base(self, playlist_id: str) -> tuple[str, list[dict]] | None:
+        """Return the cached contents an edit can be derived from.
+
+        Only the current snapshot qualifies: deriving from an older one would
+        store changes made elsewhere (another app, another user) as missing.
+        """
+        previous = await self._cached_playlist_tracks(playlist_id)
+        if not previous:
+            return None
+        try:
+            current = await self._playlist_snapshot(playlist_id)
+        except HTTPException:
+            return None
+        return previous if current == previous[0] else None
 
+    async def _cache_playlist_tracks(self, playlist_id: str, snapshot_id: str, tracks: list[dict]):
+        try:
+            await asyncio.to_thread(storage.save_playlist_tracks, playlist_id, snapshot_id, tracks)
+        except Exception:
+            pass
+
+    async def iter_tracks_from_playlist(self, playlist_id: str):
+        """Yield the playlist's projected tracks one page at a time.
+
+        Contents are cached per ``snapshot_id``, which Spotify changes whenever
+        the playlist does, so an unchanged playlist costs one metadata request.
+        """
+        snapshot_id = await self._playlist_snapshot(playlist_id)
+        cached = snapshot_id and await self._cached_playlist_tracks(playlist_id, snapshot_id)
+        metrics.count_cache("playlist_tracks", hits=bool(cached), misses=not cached)
+        if cached:
+            self._index_tracks(cached[1])
+            yield cached[1]
+            return
+        pages = self._iter_pages(
+            f"{self.base_url}/playlists/{playlist_id}/tracks",
+            {"fields": PLAYLIST_TRACK_FIELDS},
+            page_size=100,
+        )
         tracks = []
-        for track in response.json()["items"]:
-            dct = {}
-            dct["title"] = track["track"]["name"]
-            dct["track_uri"] = track["track"]["uri"]
-            dct["album_name"] = track["track"]["album"]["name"]
-            dct["artists"] = track["track"]["artists"]
-            dct["duration_ms"] = track["track"]["duration_ms"]
-            dct["explicit"] = track["track"]["explicit"]
-            tracks.append(dct)
+        async for items in pages:
+            page = self._project_tracks(items)
+            self._index_tracks(page)
+            tracks.extend(page)
+            yield page
+        if snapshot_id:
+            await self._cache_playlist_tracks(playlist_id, snapshot_id, tracks)
 
+    async def get_tracks_from_playlist(self, playlist_id: str):
+        tracks = []
+        async for page in self.iter_tracks_from_playlist(playlist_id):
+            tracks.extend(page)
         return {"tracks": tracks}
 
+    async def resolve_titles(
+        self,
+        titles: list[str],
+        concurrency: int | None = None,
+        projections: dict[str, dict] | None = None,
+    ) -> list[str | None]:
+        """Resolve ``titles`` to track URIs with bounded concurrent searches.
+
+        The result is aligned with ``titles``: entry ``i`` holds the URI of the
+        best match for ``titles[i]`` or ``None`` when the search found nothing.
+        Resolutions, including misses, are cached per normalized title and
+        looked up for the whole batch in a single Redis request.  Titles close
+        enough to a track the user already came across (playlists, library,
+        earlier searches) are matched locally without searching; those
+        matches are not cached, as the cache is shared by every user.
+
+        ``projections``, when given, receives the projected track of every
+        URI found by a search in this call (cached URIs have none).
+        """
+        try:
+            cached = await asyncio.to_thread(storage.load_track_uris, titles)
+        except Exception:
+            cached = [None] * len(titles)
+        # One search per distinct normalized title that is not cached yet.
+        pending: dict[str, str] = {}
+        for title, hit in zip(titles, cached):
+            if hit is None:
+                pending.setdefault(storage.normalize_title(title), title)
+        metrics.count_cache("track_uri", hits=len(titles) - len(pending), misses=len(pending))
+
+        # Tracks this user already came across are matched locally.
+        matched: dict[str, str] = {}
+        user_id = self.known_user_id()
+        index = fuzzy.track_indexes.get(user_id) if user_id else None
+        if index is not None and pending:
+            for key, title in list(pending.items()):
+                uri = index.best(title)
+                if uri is not None:
+                    matched[key] = uri
+                    del pending[key]
+            metrics.count_cache("fuzzy_tracks", hits=len(matched), misses=len(pending))
+
+        semaphore = asyncio.Semaphore(concurrency or SEARCH_CONCURRENCY)
+
+        async def search(title: str) -> str | None:
+            async with semaphore:
+                tracks = await self.search_track(title, limit=1)
+            if not tracks:
+                return None
+            try:
+                projected = self._project_track(tracks[0])
+            except KeyError:
+                projected = None
+            if projected is not None:
+                self._index_tracks([projected])
+                if projections is not None:
+                    projections[projected["track_uri"]] = projected
+            return tracks[0]["uri"]
+
+        found = await asyncio.gather(*(search(t) for t in pending.values()))
+        resolved = dict(zip(pending, found)) | matched
+        if pending:
+            # Local matches come from this user's tracks: only search results
+            # are shared through the cache.
+            try:
+                await asyncio.to_thread(
+                    storage.save_track_uris, dict(zip(pending.values(), found))
+                )
+            except Exception:
+                pass
+        return [
+            (hit or None) if hit is not None else resolved[storage.normalize_title(title)]
+            for title, hit in zip(titles, cached)
+        ]
+
     async def add_tracks_to_playlist(self, playlist_id: str, track_titles: TrackTitles):
-        tracks_uris = []
-        for title in track_titles.titles:
-            tracks = await self.search_track(title, limit=10)
-            if len(tracks) > 0:
-                tracks_uris.append(tracks[0]["uri"])
-            else:
-                print(f"No tracks found for {title}")
-        data = {"uris": tracks_uris}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        """Add the best match for each title and report the unresolved ones.
+
+        The cached contents of the playlist are carried over to the snapshot
+        Spotify returns when they match the playlist's current snapshot and
+        every added track's projection is known.
+        """
+        projections: dict[str, dict] = {}
+        resolved = await self.resolve_titles(track_titles.titles, projections=projections)
+        tracks_uris = [uri for uri in resolved if uri is not None]
+        not_found = [
+            title for title, uri in zip(track_titles.titles, resolved) if uri is None
+        ]
+        if not tracks_uris:
+            return {"added": tracks_uris, "not_found": not_found}
+        previous = await self._edit_base(playlist_id)
+        snapshot_id = None
+        for start in range(0, len(tracks_uris), ADD_TRACKS_BATCH):
+            data = {"uris": tracks_uris[start : start + ADD_TRACKS_BATCH]}
+            response = await self._request(
+                "POST",
                 f"{self.base_url}/playlists/{playlist_id}/tracks",
-                headers=self._auth_headers(),
                 json=data,
             )
-        if response.status_code >= 400:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to add tracks to playlist. Error: {response.text}",
+            if response.status_code >= 400:
+                raise HTTPException(
+                    status_code=response.status_code,
+                    detail=f"Failed to add tracks to playlist. Error: {response.text}",
+                )
+            snapshot_id = self._snapshot_of(response)
+        if previous and snapshot_id and all(uri in projections for uri in tracks_uris):
+            await self._cache_playlist_tracks(
+                playlist_id, snapshot_id, previous[1] + [projections[uri] for uri in tracks_uris]
             )
+        return {"added": tracks_uris, "not_found": not_found}
 
     async def remove_tracks_from_playlist(
         self, playlist_id: str, track_uris: TrackURIs
     ):
+        previous = await self._edit_base(playlist_id)
         data = {"tracks": [{"uri": uri} for uri in track_uris.track_uris]}
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"{self.base_url}/playlists/{playlist_id}/tracks",
-                headers=self._auth_headers(),
-                json=data,
-            )
+        if previous:
+            # Applied to the version the cached contents describe.
+            data["snapshot_id"] = previous[0]
+        response = await self._request(
+            "DELETE",
+            f"{self.base_url}/playlists/{playlist_id}/tracks",
+            json=data,
+        )
         if response.status_code >= 400:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Failed to remove tracks from playlist. Error: {response.text}",
             )
+        snapshot_id = self._snapshot_of(response)
+        if previous and snapshot_id:
+            # Spotify removes every occurrence of the given URIs.
+            removed = set(track_uris.track_uris)
+            await self._cache_playlist_tracks(
+                playlist_id,
+                snapshot_id,
+                [track for track in previous[1] if track["track_uri"] not in removed],
+            )
 
     async def recent(self, limit: int = 20):
         params = {"limit": limit}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/me/player/recently-played",
-                headers=self._auth_headers(),
-                params=params,
-            )
+        response = await self._request(
+            "GET",
+            f"{self.base_url}/me/player/recently-played",
+            params=params,
+        )
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json().get("items", [])
 
-    async def currently_playing(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/me/player/currently-playing",
-                headers=self._auth_headers(),
-            )
+    async def currently_playing_raw(self) -> bytes | None:
+        """Return Spotify's undecoded body, ``None`` when nothing is playing."""
+        response = await self._request(
+            "GET",
+            f"{self.base_url}/me/player/currently-playing",
+        )
         if response.status_code == 204:
             return None
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
-        return response.json()
+        return response.content
+
+    async def currently_playing(self):
+        body = await self.currently_playing_raw()
+        return None if body is None else json.loads(body)
+
+    async def top_tracks_raw(self, limit: int = 5, time_range: str = "medium_term") -> bytes:
+        """Return Spotify's undecoded page of the user's top tracks."""
+        params = {"limit": limit, "time_range": time_range}
+        response = await self._request("GET", f"{self.base_url}/me/top/tracks", params=params)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.content
 
     async def play(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/me/player/play",
-                headers=self._auth_headers(),
-            )
+        response = await self._request("POST", f"{self.base_url}/me/player/play")
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
 
     async def pause(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/me/player/pause",
-                headers=self._auth_headers(),
-            )
+        response = await self._request("POST", f"{self.base_url}/me/player/pause")
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
 
     async def next(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/me/player/next",
-                headers=self._auth_headers(),
-            )
+        response = await self._request("POST", f"{self.base_url}/me/player/next")
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
 
     async def previous(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/me/player/previous",
-                headers=self._auth_headers(),
-            )
+        response = await self._request("POST", f"{self.base_url}/me/player/previous")
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
 
-    async def get_playlists(self, limit: int = 20, offset: int = 0):
-        params = {"limit": limit, "offset": offset}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/me/playlists",
-                headers=self._auth_headers(),
-                params=params,
-            )
-        if response.status_code >= 400:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
-        return response.json().get("items", [])
+    async def get_playlists(self, limit: int | None = 20, offset: int = 0):
+        return await self._paginate(
+            f"{self.base_url}/me/playlists", offset=offset, max_items=limit
+        )
 
-    async def get_library_tracks(self, limit: int = 50, offset: int = 0):
-        params = {"limit": limit, "offset": offset}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/me/tracks",
-                headers=self._auth_headers(),
-                params=params,
-            )
-        if response.status_code >= 400:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
-        return response.json().get("items", [])
+    async def get_library(
+        self, kind: str, limit: int | None = 50, offset: int = 0, market: str | None = None
+    ):
+        """Return saved ``kind`` (``"tracks"`` or ``"albums"``).
 
-    async def get_library_albums(self, limit: int = 50, offset: int = 0):
+        With a ``market``, Spotify omits ``available_markets``.
+        """
+        params = {"market": market} if market else None
+        return await self._paginate(
+            f"{self.base_url}/me/{kind}", params, offset=offset, max_items=limit
+        )
+
+    async def get_library_page(
+        self, kind: str, limit: int = 50, offset: int = 0, market: str | None = None
+    ) -> dict:
+        """Return one page of saved ``kind`` with its ``total`` and ``next`` link."""
         params = {"limit": limit, "offset": offset}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/me/albums",
-                headers=self._auth_headers(),
-                params=params,
-            )
-        if response.status_code >= 400:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
-        return response.json().get("items", [])
+        if market:
+            params["market"] = market
+        return await self._fetch_page(f"{self.base_url}/me/{kind}", params)
+
+    async def get_library_tracks(
+        self, limit: int | None = 50, offset: int = 0, market: str | None = None
+    ):
+        """Return saved tracks; with a ``market``, Spotify omits ``available_markets``."""
+        return await self.get_library("tracks", limit, offset, market)
+
+    async def get_library_albums(
+        self, limit: int | None = 50, offset: int = 0, market: str | None = None
+    ):
+        """Return saved albums; with a ``market``, Spotify omits ``available_markets``."""
+        return await self.get_library("albums", limit, offset, market)
 
     async def get_followed_artists(self, limit: int = 50, after: str | None = None):
         params = {"type": "artist", "limit": limit}
         if after:
             params["after"] = after
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/me/following",
-                headers=self._auth_headers(),
-                params=params,
-            )
+        response = await self._request(
+            "GET",
+            f"{self.base_url}/me/following",
+            params=params,
+        )
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json().get("artists", {}).get("items", [])
 
     async def follow_artist(self, artist_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.put(
-                f"{self.base_url}/me/following",
-                headers=self._auth_headers(),
-                params={"type": "artist", "ids": artist_id},
-            )
+        response = await self._request(
+            "PUT",
+            f"{self.base_url}/me/following",
+            params={"type": "artist", "ids": artist_id},
+        )
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
 
     async def unfollow_artist(self, artist_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"{self.base_url}/me/following",
-                headers=self._auth_headers(),
-                params={"type": "artist", "ids": artist_id},
-            )
+        response = await self._request(
+            "DELETE",
+            f"{self.base_url}/me/following",
+            params={"type": "artist", "ids": artist_id},
+        )
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
 
-    async def search(self, q: str, type: str = "track,artist,album", limit: int = 10):
+    async def search(
+        self,
+        q: str,
+        type: str = "track,artist,album",
+        limit: int = 10,
+        market: str | None = None,
+    ):
         params = {"q": q, "type": type, "limit": limit}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/search",
-                headers=self._auth_headers(),
-                params=params,
-            )
+        if market:
+            params["market"] = market
+        response = await self._request("GET", f"{self.base_url}/search", params=params)
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json()
@@ -359,34 +831,35 @@ class SpotifyClient:
             "seed_genres": seed_genres,
             "limit": limit,
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/recommendations",
-                headers=self._auth_headers(),
-                params=params,
-            )
+        response = await self._request(
+            "GET",
+            f"{self.base_url}/recommendations",
+            params=params,
+        )
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         tracks = response.json().get("tracks", [])
 
-        # Filter out URIs already recommended for this user
+        # Filter out URIs already recommended recently to this user
         try:
-            from src.storage import _redis
-
             user_id = await self.get_my_user_id()
-            seen = set(_redis.smembers(f"recommended:{user_id}") or [])
-            fresh = [t for t in tracks if t.get("uri") not in seen]
-            if fresh:
-                _redis.sadd(f"recommended:{user_id}", *[t.get("uri") for t in fresh])
+            unseen = set(
+                await asyncio.to_thread(
+                    storage.unseen_recommendations,
+                    user_id,
+                    [t.get("uri") for t in tracks],
+                )
+            )
+            fresh = [t for t in tracks if t.get("uri") in unseen]
+            await asyncio.to_thread(
+                storage.remember_recommendations, user_id, [t.get("uri") for t in fresh]
+            )
             return fresh
         except Exception:
             return tracks
 
     async def get_profile(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/me", headers=self._auth_headers()
-            )
+        response = await self._request("GET", f"{self.base_url}/me")
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json()
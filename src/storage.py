@@ -1,34 +1,334 @@
-import os, json
-try:
-    from upstash_redis import Redis
-except ModuleNotFoundError:  # pragma: no cover - fallback for tests
-    class _Dummy:
-        def __init__(self):
-            self.store = {}
-        def set(self, k, v, ex=None):
-            self.store[k] = v
-        def get(self, k):
-            return self.store.get(k)
-        def sadd(self, k, *vals):
-            self.store.setdefault(k, set()).update(vals)
-        def smembers(self, k):
-            return list(self.store.get(k, set()))
-    def Redis(url=None, token=None):
-        return _Dummy()
-
-_redis = Redis(
-    url=os.getenv("UPSTASH_REDIS_REST_URL"),
-    token=os.getenv("UPSTASH_REDIS_REST_TOKEN"),
-)
+import asyncio, hashlib, os, json, time
+
+
+class _Dummy:
+    """In-memory stand-in used when ``upstash_redis`` is not installed."""
+
+    def __init__(self):
+        self.store = {}
+    def set(self, k, v, ex=None):
+        self.store[k] = v
+    def get(self, k):
+        return self.store.get(k)
+    def mget(self, *keys):
+        return [self.store.get(k) for k in keys]
+    def mset(self, values):
+        self.store.update(values)
+    def sadd(self, k, *vals):
+        self.store.setdefault(k, set()).update(vals)
+    def smembers(self, k):
+        return list(self.store.get(k, set()))
+    def zadd(self, k, scores):
+        self.store.setdefault(k, {}).update(scores)
+    def zmscore(self, k, members):
+        zset = self.store.get(k, {})
+        return [zset.get(m) for m in members]
+    def zremrangebyscore(self, k, lo, hi):
+        zset = self.store.get(k, {})
+        for m in [m for m, sc in zset.items() if lo <= sc <= hi]:
+            del zset[m]
+    def zremrangebyrank(self, k, start, stop):
+        zset = self.store.get(k, {})
+        ranked = sorted(zset, key=zset.get)
+        for m in ranked[start : (stop + 1) or None]:
+            del zset[m]
+    def expire(self, k, seconds):
+        pass
+
+
+# Created on first use by ``redis()``: importing ``upstash_redis`` and building
+# its TLS client would otherwise add well over 100 ms to every cold start.
+# Warm invocations of the same process keep reusing it.
+_redis = None
+
+
+def redis():
+    """Return the process-wide Upstash client, creating it on first use."""
+    global _redis
+    if _redis is None:
+        try:
+            from upstash_redis import Redis
+        except ModuleNotFoundError:  # pragma: no cover - fallback for tests
+            _redis = _Dummy()
+        else:
+            _redis = Redis(
+                url=os.getenv("UPSTASH_REDIS_REST_URL"),
+                token=os.getenv("UPSTASH_REDIS_REST_TOKEN"),
+            )
+    return _redis
+
 
 KEY = "spotify_tokens"
 
 
 def save_tokens(tokens: dict):
-    _redis.set(KEY, json.dumps(tokens))
+    redis().set(KEY, json.dumps(tokens))
 
 
 def load_tokens() -> dict | None:
-    val = _redis.get(KEY)
+    val = redis().get(KEY)
     return json.loads(val) if val else None
 
+
+async def asave_tokens(tokens: dict):
+    await asyncio.to_thread(save_tokens, tokens)
+
+
+async def aload_tokens() -> dict | None:
+    return await asyncio.to_thread(load_tokens)
+
+
+# ---------- Per-user tokens and sessions -------------------------------------
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", 30 * 24 * 3600))
+
+
+def save_user_tokens(user_id: str, tokens: dict):
+    redis().set(f"{KEY}:{user_id}", json.dumps(tokens))
+
+
+def load_user_tokens(user_id: str) -> dict | None:
+    val = redis().get(f"{KEY}:{user_id}")
+    return json.loads(val) if val else None
+
+
+async def asave_user_tokens(user_id: str, tokens: dict):
+    await asyncio.to_thread(save_user_tokens, user_id, tokens)
+
+
+async def aload_user_tokens(user_id: str) -> dict | None:
+    return await asyncio.to_thread(load_user_tokens, user_id)
+
+
+def _session_key(session_id: str) -> str:
+    # Only a digest is stored, so a Redis dump does not leak live sessions.
+    return "session:" + hashlib.sha256(session_id.encode()).hexdigest()
+
+
+def save_session(session_id: str, user_id: str) -> dict:
+    """Bind ``session_id`` to ``user_id`` for ``SESSION_TTL`` seconds."""
+    session = {"user_id": user_id, "expires_at": int(time.time()) + SESSION_TTL}
+    redis().set(_session_key(session_id), json.dumps(session), ex=SESSION_TTL)
+    return session
+
+
+def load_session(session_id: str) -> dict | None:
+    """Return ``{"user_id": ..., "expires_at": ...}`` or ``None``."""
+    val = redis().get(_session_key(session_id))
+    return json.loads(val) if val else None
+
+
+# ---------- Batched and async access -----------------------------------------
+# Every Upstash call is an HTTPS round trip: batch related commands with
+# ``mget``/``mset``/``pipeline`` and use the ``a*`` variants from async code so
+# the event loop never waits on Redis.
+
+
+class Pipeline:
+    """Queue Redis commands and send them in a single request.
+
+    Commands are recorded by calling them as methods, e.g.
+    ``pipe.set(key, value, ex=60)``, and :meth:`execute` returns their results
+    in order.  Clients without pipeline support run them one by one.
+    """
+
+    def __init__(self):
+        self._commands: list[tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        if not commands:
+            return []
+        client = redis()
+        if not hasattr(client, "pipeline"):
+            return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in commands]
+        pipe = client.pipeline()
+        for name, args, kwargs in commands:
+            getattr(pipe, name)(*args, **kwargs)
+        return pipe.exec()
+
+    async def aexecute(self) -> list:
+        return await asyncio.to_thread(self.execute)
+
+
+def pipeline() -> Pipeline:
+    return Pipeline()
+
+
+def mget(keys: list[str]) -> list:
+    """Return the values of ``keys`` (``None`` when missing) in one request."""
+    return list(redis().mget(*keys)) if keys else []
+
+
+def mset(values: dict[str, str], ex: int | None = None):
+    """Set every key of ``values`` in one request, optionally with a TTL."""
+    if not values:
+        return
+    if ex is None:
+        redis().mset(values)
+        return
+    pipe = pipeline()
+    for key, value in values.items():
+        pipe.set(key, value, ex=ex)
+    pipe.execute()
+
+
+async def aget(key: str):
+    return await asyncio.to_thread(redis().get, key)
+
+
+async def aset(key: str, value: str, ex: int | None = None):
+    await asyncio.to_thread(redis().set, key, value, ex=ex)
+
+
+async def amget(keys: list[str]) -> list:
+    return await asyncio.to_thread(mget, keys)
+
+
+async def amset(values: dict[str, str], ex: int | None = None):
+    await asyncio.to_thread(mset, values, ex)
+
+
+# ---------- Track title resolution cache -------------------------------------
+
+TRACK_URI_TTL = int(os.getenv("TRACK_URI_TTL", 7 * 24 * 3600))
+TRACK_MISS_TTL = int(os.getenv("TRACK_MISS_TTL", 3600))
+_NO_MATCH = "-"
+
+
+def normalize_title(title: str) -> str:
+    """Case-fold ``title`` and collapse whitespace so variants share a key."""
+    return " ".join(title.casefold().split())
+
+
+def _track_uri_key(title: str) -> str:
+    digest = hashlib.sha1(normalize_title(title).encode()).hexdigest()
+    return "track_uri:" + digest
+
+
+def save_track_uris(resolved: dict[str, str | None]):
+    """Remember title resolutions in one request; ``None`` records "no match"."""
+    pipe = pipeline()
+    for title, uri in resolved.items():
+        if uri:
+            pipe.set(_track_uri_key(title), uri, ex=TRACK_URI_TTL)
+        else:
+            pipe.set(_track_uri_key(title), _NO_MATCH, ex=TRACK_MISS_TTL)
+    pipe.execute()
+
+
+def load_track_uris(titles: list[str]) -> list[str | None]:
+    """Return, per title, the cached URI, ``""`` for a cached miss, else ``None``."""
+    values = mget([_track_uri_key(title) for title in titles])
+    return [None if val is None else "" if val == _NO_MATCH else val for val in values]
+
+
+# ---------- Per-user playlist name index -------------------------------------
+
+PLAYLIST_INDEX_TTL = int(os.getenv("PLAYLIST_INDEX_TTL", 24 * 3600))
+
+
+def save_playlist_index(user_id: str, playlists: list[dict], built_at: float | None = None):
+    """Store the compact playlist list of ``user_id`` with its build time."""
+    data = {"built_at": built_at or time.time(), "playlists": playlists}
+    redis().set(f"playlists:{user_id}", json.dumps(data), ex=PLAYLIST_INDEX_TTL)
+
+
+def load_playlist_index(user_id: str) -> dict | None:
+    """Return ``{"built_at": ..., "playlists": [...]}`` or ``None``."""
+    val = redis().get(f"playlists:{user_id}")
+    return json.loads(val) if val else None
+
+
+# ---------- Playlist contents ------------------------------------------------
+
+PLAYLIST_TRACKS_TTL = int(os.getenv("PLAYLIST_TRACKS_TTL", 7 * 24 * 3600))
+
+
+def _playlist_tracks_key(playlist_id: str, snapshot_id: str) -> str:
+    return f"playlist_tracks:{playlist_id}:{snapshot_id}"
+
+
+def save_playlist_tracks(playlist_id: str, snapshot_id: str, tracks: list[dict]):
+    """Store the projected tracks of one playlist version.
+
+    The version also becomes the latest known snapshot of the playlist, which
+    our own edits derive their new contents from.
+    """
+    pipe = pipeline()
+    pipe.set(_playlist_tracks_key(playlist_id, snapshot_id), json.dumps(tracks), ex=PLAYLIST_TRACKS_TTL)
+    pipe.set(f"playlist_snapshot:{playlist_id}", snapshot_id, ex=PLAYLIST_TRACKS_TTL)
+    pipe.execute()
+
+
+def load_playlist_tracks(
+    playlist_id: str, snapshot_id: str | None = None
+) -> tuple[str, list[dict]] | None:
+    """Return ``(snapshot_id, tracks)`` or ``None`` when not cached.
+
+    Without ``snapshot_id`` the latest known snapshot is returned.
+    """
+    if snapshot_id is None:
+        snapshot_id = redis().get(f"playlist_snapshot:{playlist_id}")
+        if not snapshot_id:
+            return None
+    val = redis().get(_playlist_tracks_key(playlist_id, snapshot_id))
+    return (snapshot_id, json.loads(val)) if val else None
+
+
+# ---------- Recommendation history -------------------------------------------
+
+RECOMMENDATION_WINDOW = int(os.getenv("RECOMMENDATION_WINDOW", 30 * 24 * 3600))
+RECOMMENDATION_MAX = int(os.getenv("RECOMMENDATION_MAX", 2000))
+
+
+def _recommended_key(user_id: str) -> str:
+    return f"recommended_at:{user_id}"
+
+
+def unseen_recommendations(user_id: str, uris: list[str]) -> list[str]:
+    """Return the ``uris`` not recommended to ``user_id`` within the window.
+
+    Only the candidate members are looked up (``ZMSCORE``), never the whole
+    history.
+    """
+    if not uris:
+        return []
+    scores = redis().zmscore(_recommended_key(user_id), uris) or [None] * len(uris)
+    cutoff = time.time() - RECOMMENDATION_WINDOW
+    return [
+        uri for uri, score in zip(uris, scores)
+        if score is None or float(score) < cutoff
+    ]
+
+
+def remember_recommendations(user_id: str, uris: list[str]):
+    """Record ``uris`` as recommended now and trim the history.
+
+    Entries older than ``RECOMMENDATION_WINDOW`` are dropped and at most
+    ``RECOMMENDATION_MAX`` of the newest are kept; the key itself expires once
+    the user stops asking for recommendations.
+    """
+    if not uris:
+        return
+    key = _recommended_key(user_id)
+    now = time.time()
+    pipe = pipeline()
+    pipe.zadd(key, {uri: now for uri in uris})
+    pipe.zremrangebyscore(key, 0, now - RECOMMENDATION_WINDOW)
+    pipe.zremrangebyrank(key, 0, -RECOMMENDATION_MAX - 1)
+    pipe.expire(key, RECOMMENDATION_WINDOW)
+    pipe.execute()
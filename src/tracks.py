@@ -1,56 +1,51 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import PlainTextResponse
-from .auth import valid_access_token
+from .auth import current_access_token
+from .services.spotify import SpotifyClient
+from .utils.http import get_http_client
+from .utils.responses import RawJSONResponse, json_response
 import httpx
 
 router = APIRouter()
 
 @router.get("/top_tracks")
-async def top_tracks(limit: int = 5, time_range: str = "medium_term"):
+async def top_tracks(
+    limit: int = 5,
+    time_range: str = "medium_term",
+    token: str | None = Depends(current_access_token),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+):
     if limit < 1 or limit > 50:
         raise HTTPException(status_code=400, detail="limit must be between 1 and 50")
-    token = valid_access_token()
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            "https://api.spotify.com/v1/me/top/tracks",
-            headers={"Authorization": f"Bearer {token}"},
-            params={"limit": limit, "time_range": time_range},
-        )
-    if r.status_code >= 400:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
-    return r.json()
+    client = SpotifyClient(token, http_client=http_client)
+    # Spotify's body is forwarded untouched, without decoding it.
+    return RawJSONResponse(await client.top_tracks_raw(limit, time_range))
 
 
 @router.get("/recent")
-async def recent(limit: int = 20):
-    token = valid_access_token()
+async def recent(
+    limit: int = 20,
+    token: str | None = Depends(current_access_token),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+):
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            "https://api.spotify.com/v1/me/player/recently-played",
-            headers={"Authorization": f"Bearer {token}"},
-            params={"limit": limit},
-        )
-    if r.status_code >= 400:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
-    return r.json().get("items", [])
+    client = SpotifyClient(token, http_client=http_client)
+    return json_response(await client.recent(limit))
 
 
 @router.get("/currently_playing")
-async def currently_playing():
-    token = valid_access_token()
+async def currently_playing(
+    token: str | None = Depends(current_access_token),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+):
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            "https://api.spotify.com/v1/me/player/currently-playing",
-            headers={"Authorization": f"Bearer {token}"},
-        )
-    if r.status_code == 204:
+    # Polled often: concurrent and back-to-back calls share one upstream GET.
+    client = SpotifyClient(token, http_client=http_client)
+    body = await client.currently_playing_raw()
+    if body is None:
         return PlainTextResponse(status_code=204)
-    if r.status_code >= 400:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
-    return r.json()
+    return RawJSONResponse(body)
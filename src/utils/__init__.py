@@ -1,9 +1,8 @@
-from fastapi import Depends, HTTPException
+import httpx
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from src.services.spotify import SpotifyClient
-
-from .http import safe_get  # re-export
+from .http import get_http_client, safe_get  # re-export
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
@@ -16,14 +15,24 @@ def ensure_token_passed(
     return credentials.credentials
 
 
-def get_spotify_client(access_token: str = Depends(ensure_token_passed)):
-    return SpotifyClient(access_token)
+def get_spotify_client(
+    access_token: str = Depends(ensure_token_passed),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+):
+    from src.services.spotify import SpotifyClient
+
+    return SpotifyClient(access_token, http_client=http_client)
 
 
-def get_redis_spotify_client():
-    from src.auth import valid_access_token
+async def get_redis_spotify_client(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+):
+    from src.auth import request_access_token
+    from src.services.spotify import SpotifyClient
 
-    token = valid_access_token()
+    token = await request_access_token(request, credentials, http_client)
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    return SpotifyClient(token)
+    return SpotifyClient(token, http_client=http_client)
@@ -0,0 +1,192 @@
+"""In-process LRU cache layered in front of the Redis cache."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from src import storage
+from src.utils import metrics
+from src.utils.singleflight import SingleFlight
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Background revalidations, referenced until done so they are not collected.
+_BACKGROUND_TASKS: set[asyncio.Task] = set()
+
+
+class LRUCache:
+    """Size-bounded cache whose entries turn stale, then expire.
+
+    ``get`` returns ``(value, fresh)`` so callers can serve a stale value
+    while they refresh it, or ``None`` once the entry has expired or was
+    evicted.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, tuple[Any, float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> tuple[Any, bool] | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, fresh_until, expires_at = entry
+        now = time.monotonic()
+        if now >= expires_at:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value, now < fresh_until
+
+    def set(self, key: Hashable, value: Any, fresh_for: float, expires_in: float):
+        now = time.monotonic()
+        self._data[key] = (value, now + fresh_for, now + max(fresh_for, expires_in))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class TwoTierCache:
+    """JSON values cached in process (L1) and in Redis (L2).
+
+    A fresh L1 hit costs no I/O.  A stale L1 hit is returned immediately and
+    revalidated in the background.  On an L1 miss the value is read from
+    Redis, or produced by ``load()`` and written back; concurrent misses for
+    the same key share a single load.
+    """
+
+    def __init__(self, maxsize: int = 1024, local_ttl: float = 60.0, name: str = "default"):
+        self.name = name
+        self.local = LRUCache(maxsize)
+        self.local_ttl = local_ttl
+        self._flight = SingleFlight()
+
+    async def get(
+        self, key: str, load: Callable[[], Awaitable[Any]], ttl: int | None
+    ) -> Any:
+        """Return the value of ``key``; ``ttl=None`` marks it immutable."""
+        entry = self.local.get(key)
+        metrics.count_cache(self.name + "_local", hits=entry is not None, misses=entry is None)
+        if entry is not None:
+            value, fresh = entry
+            if not fresh:
+                self._revalidate(key, load, ttl)
+            return value
+        return await self._flight.do(key, lambda: self._fill(key, load, ttl))
+
+    async def _fill(
+        self, key: str, load: Callable[[], Awaitable[Any]], ttl: int | None
+    ) -> Any:
+        try:
+            cached = await storage.aget(key)
+        except Exception:
+            cached = None
+        metrics.count_cache(self.name + "_redis", hits=bool(cached), misses=not cached)
+        if cached:
+            value = json.loads(cached)
+        else:
+            value = await load()
+            try:
+                await storage.aset(key, json.dumps(value), ex=ttl)
+            except Exception:
+                pass
+        self._remember(key, value, ttl)
+        return value
+
+    def _remember(self, key: str, value: Any, ttl: int | None):
+        if ttl is None:
+            self.local.set(key, value, float("inf"), float("inf"))
+        else:
+            self.local.set(key, value, min(self.local_ttl, ttl), ttl)
+
+    async def get_many(
+        self, items: list[tuple[str, Callable[[], Awaitable[Any]]]], ttl: int | None
+    ) -> list:
+        """Return the values of several ``(key, load)`` pairs, in order.
+
+        L1 misses are read from Redis with a single ``MGET``; keys missing
+        there too are loaded concurrently and written back in one request.
+        A load that fails leaves its exception in place of the value, and
+        the other values are still cached and returned.
+        """
+        results: list[Any] = [None] * len(items)
+        missing: dict[str, list[int]] = {}
+        loaders: dict[str, Callable[[], Awaitable[Any]]] = {}
+        for i, (key, load) in enumerate(items):
+            entry = self.local.get(key)
+            if entry is not None:
+                value, fresh = entry
+                if not fresh:
+                    self._revalidate(key, load, ttl)
+                results[i] = value
+            else:
+                missing.setdefault(key, []).append(i)
+                loaders[key] = load
+        local_misses = sum(len(indexes) for indexes in missing.values())
+        metrics.count_cache(
+            self.name + "_local", hits=len(items) - local_misses, misses=local_misses
+        )
+        if not missing:
+            return results
+
+        try:
+            cached = await storage.amget(list(missing))
+        except Exception:
+            cached = [None] * len(missing)
+        to_load = []
+        for key, raw in zip(missing, cached):
+            if raw:
+                value = json.loads(raw)
+                self._remember(key, value, ttl)
+                for i in missing[key]:
+                    results[i] = value
+            else:
+                to_load.append(key)
+        metrics.count_cache(
+            self.name + "_redis", hits=len(missing) - len(to_load), misses=len(to_load)
+        )
+
+        loaded = await asyncio.gather(
+            *(self._flight.do(key, loaders[key]) for key in to_load),
+            return_exceptions=True,
+        )
+        fresh = {}
+        for key, value in zip(to_load, loaded):
+            if isinstance(value, BaseException):
+                LOGGER.warning("loading %s failed: %s", key, value)
+            else:
+                self._remember(key, value, ttl)
+                fresh[key] = value
+            for i in missing[key]:
+                results[i] = value
+        if fresh:
+            try:
+                await storage.amset(
+                    {key: json.dumps(value) for key, value in fresh.items()}, ex=ttl
+                )
+            except Exception:
+                pass
+        return results
+
+    def _revalidate(
+        self, key: str, load: Callable[[], Awaitable[Any]], ttl: int | None
+    ):
+        if self._flight.in_flight(key):
+            return
+        task = asyncio.ensure_future(self._flight.do(key, lambda: self._fill(key, load, ttl)))
+        _BACKGROUND_TASKS.add(task)
+
+        def done(task: asyncio.Task):
+            _BACKGROUND_TASKS.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                LOGGER.warning("background refresh of %s failed: %s", key, task.exception())
+
+        task.add_done_callback(done)
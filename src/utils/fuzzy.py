@@ -0,0 +1,128 @@
+"""In-process trigram index for fuzzy matching of titles and names."""
+from __future__ import annotations
+
+import heapq
+import os
+import re
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Hashable, Iterable
+
+# Dice similarity a fuzzy match needs to be trusted instead of asking Spotify.
+FUZZY_MIN_SCORE = float(os.getenv("FUZZY_MIN_SCORE", "0.75"))
+# Users whose track index is kept in memory.
+FUZZY_MAX_USERS = int(os.getenv("FUZZY_MAX_USERS", "64"))
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Casefold, strip accents and reduce punctuation to single spaces."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", stripped.casefold()).strip()
+
+
+def trigrams(text: str) -> frozenset[str]:
+    padded = f"  {normalize(text)} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    """Documents keyed by any hashable, scored by trigram overlap.
+
+    ``search`` only visits documents sharing at least one trigram with the
+    query, so matching stays fast for libraries of thousands of tracks.
+    """
+
+    def __init__(self):
+        self._docs: dict[Hashable, tuple[frozenset[str], object]] = {}
+        self._postings: dict[str, set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, key: Hashable, text: str, value: object = None):
+        """Index ``text`` under ``key``; ``value`` is returned by searches."""
+        self.remove(key)
+        grams = trigrams(text)
+        self._docs[key] = (grams, value)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key: Hashable):
+        entry = self._docs.pop(key, None)
+        if entry is None:
+            return
+        for gram in entry[0]:
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def search(self, text: str, limit: int = 5, min_score: float = 0.0) -> list[tuple[float, object]]:
+        """Return up to ``limit`` ``(score, value)`` pairs, best first.
+
+        The score is the Dice coefficient of both trigram sets, from 0 to 1.
+        """
+        grams = trigrams(text)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = (
+            (2 * count / (len(grams) + len(self._docs[key][0])), key)
+            for key, count in shared.items()
+        )
+        best = heapq.nlargest(limit, (item for item in scored if item[0] >= min_score), key=lambda item: item[0])
+        return [(score, self._docs[key][1]) for score, key in best]
+
+    def best(self, text: str, min_score: float | None = None) -> object | None:
+        """Return the value of the single best match, or ``None``.
+
+        Ties between different values are ambiguous and count as a miss.
+        """
+        threshold = FUZZY_MIN_SCORE if min_score is None else min_score
+        top = self.search(text, limit=2, min_score=threshold)
+        if not top:
+            return None
+        if len(top) == 2 and top[0][0] == top[1][0] and top[0][1] != top[1][1]:
+            return None
+        return top[0][1]
+
+
+class TrackIndexes:
+    """Per-user :class:`TrigramIndex` of known tracks, least recently used evicted.
+
+    Each track is indexed by its title and by title plus artists, so both
+    ``"Song"`` and ``"Song - Artist"`` style queries resolve to its URI.
+    """
+
+    def __init__(self, maxsize: int = FUZZY_MAX_USERS):
+        self.maxsize = maxsize
+        self._indexes: OrderedDict[str, TrigramIndex] = OrderedDict()
+
+    def get(self, user_id: str) -> TrigramIndex | None:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            self._indexes.move_to_end(user_id)
+        return index
+
+    def add_tracks(self, user_id: str, tracks: Iterable[tuple[str, str, list[str]]]):
+        """Index ``(uri, title, artist names)`` triples for ``user_id``."""
+        index = self.get(user_id)
+        if index is None:
+            index = self._indexes[user_id] = TrigramIndex()
+            while len(self._indexes) > self.maxsize:
+                self._indexes.popitem(last=False)
+        for uri, title, artists in tracks:
+            if not uri or not title:
+                continue
+            index.add((uri, 0), title, uri)
+            if artists:
+                index.add((uri, 1), f"{title} {' '.join(artists)}", uri)
+
+    def clear(self):
+        self._indexes.clear()
+
+
+track_indexes = TrackIndexes()
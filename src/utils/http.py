@@ -1,15 +1,106 @@
 """HTTP helper utilities with basic retry logic."""
 from __future__ import annotations
 
+import asyncio
+import importlib.util
 import logging
+import os
+import random
+import ssl
 import time
-from typing import Any
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator
 
 import httpx
 
+from src.utils import metrics
+
 
 LOGGER = logging.getLogger(__name__)
 
+# App-wide pooled client, opened by the FastAPI lifespan or, where none runs
+# (serverless invocations), by the first request that needs it.
+_client: httpx.AsyncClient | None = None
+# Event loop ``_client`` was opened on: its connections cannot serve another.
+_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+@lru_cache(maxsize=1)
+def ssl_context() -> ssl.SSLContext:
+    """Return the process-wide TLS context.
+
+    Loading the CA bundle takes tens of milliseconds, which every new
+    ``httpx.AsyncClient`` would otherwise pay again; warm serverless
+    invocations and short-lived clients reuse this one.
+    """
+    return httpx.create_ssl_context()
+
+
+def create_async_client() -> httpx.AsyncClient:
+    """Build a keep-alive ``httpx.AsyncClient`` configured from the environment.
+
+    ``HTTP_MAX_CONNECTIONS``, ``HTTP_MAX_KEEPALIVE`` and ``HTTP_KEEPALIVE_EXPIRY``
+    size the pool, ``HTTP_TIMEOUT`` and ``HTTP_CONNECT_TIMEOUT`` bound each
+    request and ``HTTP2=1`` enables HTTP/2 when the ``h2`` package is installed.
+    """
+    limits = httpx.Limits(
+        max_connections=int(_env_float("HTTP_MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(_env_float("HTTP_MAX_KEEPALIVE", 20)),
+        keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 30.0),
+    )
+    timeout = httpx.Timeout(
+        _env_float("HTTP_TIMEOUT", 15.0),
+        connect=_env_float("HTTP_CONNECT_TIMEOUT", 5.0),
+    )
+    http2 = os.getenv("HTTP2", "").lower() in ("1", "true", "yes")
+    if http2 and importlib.util.find_spec("h2") is None:
+        LOGGER.warning("HTTP2 requested but the h2 package is not installed")
+        http2 = False
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2, verify=ssl_context())
+
+
+async def open_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it if it does not exist yet.
+
+    A client left over from another event loop (a previous invocation run
+    with ``asyncio.run``) is replaced rather than reused.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = create_async_client()
+        _client_loop = loop
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client, releasing its pooled connections."""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _client_loop = None
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, opening it on first use like ``storage.redis``."""
+    return await open_http_client()
+
+
+@asynccontextmanager
+async def client_session(
+    client: httpx.AsyncClient | None = None,
+) -> AsyncIterator[httpx.AsyncClient]:
+    """Yield ``client`` when given, else the shared client."""
+    yield client if client is not None else await open_http_client()
+
 
 def safe_get(url: str, retries: int = 3, backoff: float = 1.0, **kwargs: Any) -> httpx.Response:
     """Perform a GET request with simple retry and exponential backoff.
@@ -42,3 +133,99 @@ def safe_get(url: str, retries: int = 3, backoff: float = 1.0, **kwargs: Any) ->
                 return resp
         time.sleep(backoff)
         backoff *= 2
+
+
+def retry_after(resp: httpx.Response) -> float | None:
+    """Return the delay requested by a ``Retry-After`` header, in seconds."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+async def async_get(
+    url: str,
+    retries: int = 3,
+    backoff: float = 1.0,
+    max_backoff: float = 30.0,
+    deadline: float | None = None,
+    client: httpx.AsyncClient | None = None,
+    service: str | None = None,
+    endpoint: str | None = None,
+    **kwargs: Any,
+) -> httpx.Response:
+    """Perform a non-blocking GET with jittered exponential backoff.
+
+    Parameters
+    ----------
+    url: str
+        Target URL.
+    retries: int
+        Number of attempts before giving up.
+    backoff: float
+        Initial backoff ceiling in seconds; each retry sleeps a random amount
+        up to it ("full jitter") and the ceiling doubles up to ``max_backoff``.
+    max_backoff: float
+        Upper bound for the backoff ceiling.
+    deadline: float | None
+        Total time budget in seconds. Each attempt's timeout is capped by it
+        and no retry is attempted once waiting would exceed it.
+    client: httpx.AsyncClient | None
+        Client to use; defaults to the shared pooled client.
+    service, endpoint: str | None
+        Labels of the upstream latency metric; default to the URL's host and
+        path.
+    kwargs: Any
+        Additional arguments passed to ``AsyncClient.get``.
+
+    ``429`` and ``5xx`` responses as well as network errors are retried; a
+    ``Retry-After`` header overrides the computed delay. Other ``4xx``
+    responses are returned immediately.
+    """
+    stop_at = time.monotonic() + deadline if deadline is not None else None
+    if service is None or endpoint is None:
+        parts = httpx.URL(url)
+        service = service or parts.host
+        endpoint = endpoint or metrics.endpoint_template(parts.path)
+    attempt = 0
+    async with client_session(client) as session:
+        while True:
+            attempt += 1
+            resp = None
+            if stop_at is not None:
+                # Never let a single attempt outlive the overall deadline.
+                kwargs["timeout"] = max(0.001, stop_at - time.monotonic())
+            started = time.perf_counter()
+            try:
+                resp = await session.get(url, **kwargs)
+            except httpx.HTTPError as exc:  # network error
+                metrics.observe_upstream(service, endpoint, "error", started)
+                LOGGER.warning("async_get network error on %s: %s", url, exc)
+                if attempt >= retries:
+                    raise
+            else:
+                metrics.observe_upstream(service, endpoint, resp.status_code, started)
+                retryable = resp.status_code == 429 or resp.status_code >= 500
+                if not retryable:
+                    return resp
+                LOGGER.warning("async_get %s returned %s", url, resp.status_code)
+                if attempt >= retries:
+                    return resp
+            delay = random.uniform(0, backoff)
+            if resp is not None:
+                requested = retry_after(resp)
+                if requested is not None:
+                    delay = requested
+            if stop_at is not None and time.monotonic() + delay > stop_at:
+                if resp is None:
+                    raise httpx.TimeoutException(f"deadline exceeded for {url}")
+                return resp
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, max_backoff)
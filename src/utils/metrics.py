@@ -0,0 +1,209 @@
+"""In-process Prometheus metrics.
+
+A handful of counters, gauges and histograms kept in plain dicts and rendered
+in the Prometheus text exposition format by ``/metrics``.  Recording is a
+dict lookup plus a ``bisect``; everything runs on the event loop, so no
+locking is needed.
+"""
+from __future__ import annotations
+
+import re
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable
+
+# Latency buckets in seconds, from cache hits to slow upstream retries.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """Return the sample lines following the ``HELP``/``TYPE`` header."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def count(self, *labels) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = _labels(self.labels, key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent serving HTTP requests.",
+    ("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Time spent in calls to upstream APIs, one observation per attempt.",
+    ("service", "endpoint", "status"),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result.",
+    ("cache", "result"),
+)
+
+REGISTRY: list[_Metric] = [REQUEST_LATENCY, REQUESTS_IN_FLIGHT, UPSTREAM_LATENCY, CACHE_REQUESTS]
+
+
+def render() -> str:
+    """Return every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def observe_upstream(service: str, endpoint: str, status: int | str, started: float):
+    """Record an upstream call that started at ``time.perf_counter()`` ``started``."""
+    UPSTREAM_LATENCY.observe(time.perf_counter() - started, service, endpoint, str(status))
+
+
+def count_cache(cache: str, hits: int = 0, misses: int = 0):
+    if hits:
+        CACHE_REQUESTS.inc(cache, "hit", amount=hits)
+    if misses:
+        CACHE_REQUESTS.inc(cache, "miss", amount=misses)
+
+
+# Path segments following these collections are ids, e.g. ``/playlists/{id}``.
+_ID_COLLECTIONS = {"users", "playlists", "artists", "albums", "tracks", "shows", "episodes"}
+_VERSION = re.compile(r"^/v\d+")
+
+
+def endpoint_template(path: str) -> str:
+    """Return ``path`` with resource ids replaced by ``{id}``."""
+    segments = _VERSION.sub("", path).split("/")
+    for i in range(1, len(segments)):
+        if segments[i - 1] in _ID_COLLECTIONS and segments[i] not in _ID_COLLECTIONS:
+            segments[i] = "{id}"
+    return "/".join(segments)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template.
+
+    Requests that match no route are labelled ``<unmatched>`` to keep the
+    label set bounded.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "<unmatched>"),
+                str(status),
+            )
@@ -0,0 +1,104 @@
+"""Field selection for Spotify objects returned by the API endpoints.
+
+Fields use Spotify's own syntax: a comma separated list where ``key(...)``
+selects inside nested objects, e.g. ``name,uri,artists(name),album(name)``.
+Lists are projected item by item and missing keys are skipped, so one
+selection can serve tracks, albums and artists alike.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any
+
+from fastapi import HTTPException
+
+# ``None`` selects a whole value.
+Tree = dict[str, "Tree | None"]
+
+# Compact projections served when an endpoint gets no ``fields`` parameter.
+DEFAULT_FIELDS = {
+    "search": (
+        "name,id,uri,artists(name,uri),album(name,uri),duration_ms,explicit,"
+        "release_date,total_tracks,genres,followers(total)"
+    ),
+    "library_tracks": (
+        "added_at,track(name,id,uri,duration_ms,explicit,album(name,uri),artists(name,uri))"
+    ),
+    "library_albums": (
+        "added_at,album(name,id,uri,release_date,total_tracks,artists(name,uri))"
+    ),
+    "playlists": "name,id,uri,public,collaborative,owner(id,display_name),tracks(total)",
+    "profile": "display_name,id,uri,country,product,followers(total)",
+}
+# Passed as ``fields`` to get Spotify's complete objects.
+ALL_FIELDS = "*"
+
+
+@lru_cache(maxsize=256)
+def parse_fields(fields: str) -> Tree:
+    """Parse a field selection, raising ``ValueError`` when malformed."""
+    text = fields.replace(" ", "")
+    tree, end = _parse(text, 0)
+    if end != len(text):
+        raise ValueError(f"unexpected ')' at {end}")
+    if not tree:
+        raise ValueError("empty field selection")
+    return tree
+
+
+def _parse(text: str, pos: int) -> tuple[Tree, int]:
+    tree: Tree = {}
+    while pos < len(text):
+        end = pos
+        while end < len(text) and text[end] not in ",()":
+            end += 1
+        key = text[pos:end]
+        if not key:
+            raise ValueError(f"missing field name at {pos}")
+        if end < len(text) and text[end] == "(":
+            sub, end = _parse(text, end + 1)
+            if end >= len(text) or text[end] != ")":
+                raise ValueError(f"unclosed '(' after {key!r}")
+            if not sub:
+                raise ValueError(f"empty selection for {key!r}")
+            tree[key] = sub
+            end += 1
+        else:
+            tree[key] = None
+        if end < len(text) and text[end] == ",":
+            pos = end + 1
+            continue
+        return tree, end
+    return tree, pos
+
+
+def project(value: Any, tree: Tree | None) -> Any:
+    """Return ``value`` reduced to the fields of ``tree``."""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+
+def select(fields: str | None, endpoint: str) -> Tree | None:
+    """Resolve an endpoint's ``fields`` parameter to a tree.
+
+    ``None`` selects the endpoint's compact default and ``ALL_FIELDS`` the
+    complete object (returned as ``None``).  Malformed selections are a 400.
+    """
+    if fields == ALL_FIELDS:
+        return None
+    try:
+        return parse_fields(fields or DEFAULT_FIELDS[endpoint])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {exc}")
+
+
+def mentions(tree: Tree | None, key: str) -> bool:
+    """Return whether ``tree`` names ``key`` at any depth; ``None`` keeps all."""
+    if tree is None:
+        return True
+    return any(k == key or (sub is not None and mentions(sub, key)) for k, sub in tree.items())
@@ -0,0 +1,80 @@
+"""Client-side token bucket used to pace calls to an upstream API."""
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token bucket shared by every caller in the process.
+
+    ``rate`` tokens are added per second up to ``capacity``. Callers reserve a
+    token in :meth:`acquire`; when none is left the balance goes negative and
+    the caller sleeps until its reservation is covered, so waiting callers are
+    served in arrival order without a lock. :meth:`pause` stops the bucket
+    until a deadline, e.g. after a ``429`` with ``Retry-After``; callers can
+    check :meth:`paused_for` to fail fast instead of waiting out a long one.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self.waiting = 0
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _reserve(self) -> float:
+        now = time.monotonic()
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+        self._tokens -= 1
+        return max(0.0, self._updated - now) + max(0.0, -self._tokens) / self.rate
+
+    async def acquire(self) -> float:
+        """Wait for a token and return the time spent waiting, in seconds."""
+        wait = self._reserve()
+        self.acquired += 1
+        if wait > 0:
+            self.waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.waiting -= 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def pause(self, seconds: float, max_hold: float | None = None):
+        """Hold every new reservation for ``seconds`` and drop saved-up burst.
+
+        Reservations are held for at most ``max_hold`` seconds; the rest of the
+        pause is only reported by :meth:`paused_for`.
+        """
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        until = now + (seconds if max_hold is None else min(seconds, max_hold))
+        self.throttled += 1
+        if until > self._updated:
+            self._tokens = min(self._tokens, 1.0)
+            self._updated = until
+
+    def paused_for(self) -> float:
+        """Return the seconds left of the longest pause requested."""
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def stats(self) -> dict:
+        """Return queue depth and wait statistics."""
+        return {
+            "queue_depth": self.waiting,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "total_wait_seconds": round(self.total_wait, 3),
+            "max_wait_seconds": round(self.max_wait, 3),
+            "avg_wait_seconds": round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+        }
@@ -0,0 +1,38 @@
+"""JSON response classes backed by ``orjson`` when it is installed."""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+# Default response class of the app.
+FastJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+def dumps(value: Any) -> bytes:
+    """Encode ``value`` as compact JSON."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """Serialize plain JSON data directly, skipping ``jsonable_encoder``.
+
+    FastAPI walks every returned value to convert models, dates and the like
+    before encoding it; upstream JSON only holds plain types and does not
+    need that walk.
+    """
+    return FastJSONResponse(content, status_code=status_code)
+
+
+class RawJSONResponse(Response):
+    """Send an already encoded JSON body, such as an upstream response, as is."""
+
+    media_type = "application/json"
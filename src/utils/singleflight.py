@@ -0,0 +1,67 @@
+"""Collapse concurrent calls for the same key into a single execution."""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its result.
+
+    The first caller for ``key`` starts ``fn()``; callers arriving while it is
+    in flight await the same result (or exception).  Cancelling one waiter
+    does not cancel the shared call.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+
+            def forget(done: asyncio.Future):
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+
+            future.add_done_callback(forget)
+        return await asyncio.shield(future)
+
+
+class InlineSingleFlight(SingleFlight):
+    """:class:`SingleFlight` whose first caller runs the call itself.
+
+    No task is spawned per call, which keeps very frequent calls cheap.  The
+    shared call now belongs to its first caller: if that caller is cancelled
+    the others retry, one of them running the call again.
+    """
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while key in self._calls:
+            shared = self._calls[key]
+            try:
+                return await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+
+        shared = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            shared.cancel()
+            raise
+        except BaseException as exc:
+            shared.set_exception(exc)
+            shared.exception()  # nobody may be waiting: do not log it as lost
+            raise
+        else:
+            shared.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
@@ -49,3 +49,16 @@ if hasattr(httpx, "ASGITransport") and hasattr(httpx, "Client"):
         _orig_init(self, *args, **kwargs)
 
     httpx.Client.__init__ = _patched_init  # type: ignore
+
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    """Keep tests off the network: unconfigured Upstash clients retry for seconds."""
+    import src.storage
+
+    fake = src.storage._Dummy()
+    monkeypatch.setattr(src.storage, "_redis", fake)
+    return fake
@@ -0,0 +1,88 @@
+import asyncio
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.dtos.api import TrackTitles
+from src.services.spotify import SpotifyClient
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.ttl = {}
+    def get(self, k):
+        return self.store.get(k)
+    def mget(self, *keys):
+        return [self.store.get(k) for k in keys]
+    def set(self, k, v, ex=None):
+        self.store[k] = v
+        self.ttl[k] = ex
+
+
+def test_add_tracks_resolves_concurrently_in_order(monkeypatch):
+    client = SpotifyClient("token")
+    active = 0
+    peak = 0
+    posted = []
+
+    async def fake_search(query, limit=10):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01 if query == "first" else 0)
+        active -= 1
+        return [] if query == "missing" else [{"uri": f"spotify:track:{query}"}]
+
+    class DummyResp:
+        status_code = 200
+        text = ""
+
+    class DummyAsyncClient:
+        is_closed = False
+
+        def __init__(self, **kwargs):
+            pass
+        async def __aenter__(self):
+            return self
+        async def __aexit__(self, exc_type, exc, tb):
+            pass
+        async def post(self, url, headers=None, json=None):
+            posted.append(json["uris"])
+            return DummyResp()
+
+    monkeypatch.setattr(client, "search_track", fake_search)
+    monkeypatch.setattr("src.storage._redis", FakeRedis())
+    monkeypatch.setattr("src.services.spotify.SEARCH_CONCURRENCY", 2)
+    monkeypatch.setattr("httpx.AsyncClient", DummyAsyncClient)
+
+    titles = TrackTitles(titles=["first", "missing", "second", "third"])
+    result = asyncio.run(client.add_tracks_to_playlist("pid", titles))
+
+    assert result == {
+        "added": ["spotify:track:first", "spotify:track:second", "spotify:track:third"],
+        "not_found": ["missing"],
+    }
+    assert posted == [result["added"]]
+    assert peak == 2
+
+
+def test_title_resolution_cache(monkeypatch):
+    from src import storage
+
+    client = SpotifyClient("token")
+    fake = FakeRedis()
+    searches = []
+
+    async def fake_search(query, limit=10):
+        searches.append(query)
+        return [] if query == "nothing" else [{"uri": "spotify:track:1"}]
+
+    monkeypatch.setattr(client, "search_track", fake_search)
+    monkeypatch.setattr("src.storage._redis", fake)
+
+    first = asyncio.run(client.resolve_titles(["Song  A", "nothing"]))
+    again = asyncio.run(client.resolve_titles(["song a", "Nothing"]))
+
+    assert first == again == ["spotify:track:1", None]
+    assert searches == ["Song  A", "nothing"]
+    assert sorted(fake.ttl.values()) == [storage.TRACK_MISS_TTL, storage.TRACK_URI_TTL]
@@ -0,0 +1,50 @@
+import asyncio
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+
+from src.utils import http
+
+
+def _run(handler, **kwargs):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await http.async_get("https://example.com/x", client=client, **kwargs)
+    return asyncio.run(run())
+
+
+def test_async_get_honors_retry_after(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(http.asyncio, "sleep", fake_sleep)
+    responses = iter([
+        httpx.Response(429, headers={"Retry-After": "2"}),
+        httpx.Response(503),
+        httpx.Response(200, json={"ok": True}),
+    ])
+    resp = _run(lambda request: next(responses), backoff=0.5)
+    assert resp.json() == {"ok": True}
+    assert sleeps[0] == 2
+    assert 0 <= sleeps[1] <= 1.0
+
+
+def test_async_get_does_not_retry_client_errors():
+    calls = []
+    resp = _run(lambda request: calls.append(1) or httpx.Response(404))
+    assert resp.status_code == 404
+    assert len(calls) == 1
+
+
+def test_async_get_stops_at_deadline(monkeypatch):
+    async def fake_sleep(delay):
+        raise AssertionError("should not wait past the deadline")
+
+    monkeypatch.setattr(http.asyncio, "sleep", fake_sleep)
+    resp = _run(
+        lambda request: httpx.Response(429, headers={"Retry-After": "60"}),
+        deadline=5,
+    )
+    assert resp.status_code == 429
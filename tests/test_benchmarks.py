@@ -0,0 +1,20 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.run import compare
+
+
+def test_compare_flags_slower_and_heavier_cases():
+    baseline = {
+        "fast": {"ops_per_sec": 1000.0, "peak_kib_per_op": 10.0},
+        "lean": {"ops_per_sec": 1000.0, "peak_kib_per_op": 100.0},
+    }
+    results = {
+        "fast": {"ops_per_sec": 600.0, "peak_kib_per_op": 10.5},
+        "lean": {"ops_per_sec": 900.0, "peak_kib_per_op": 130.0},
+        "new": {"ops_per_sec": 1.0, "peak_kib_per_op": 1e6},
+    }
+    regressions = compare(results, baseline, speed_tolerance=0.3, memory_tolerance=0.1)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("fast: 600.0 ops/s")
+    assert regressions[1].startswith("lean: 130.0 KiB/op")
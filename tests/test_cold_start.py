@@ -0,0 +1,21 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.imports import LAZY_MODULES, check, profile
+
+
+def test_entry_point_defers_lazy_modules():
+    # Only what is imported is checked: the time budget depends on the
+    # machine and is left to ``python -m benchmarks.imports``.
+    timings, loaded = profile()
+    assert "src.index" in timings
+    assert [name for name in LAZY_MODULES if name in loaded] == []
+
+
+def test_check_reports_eager_modules_and_overruns():
+    timings = {"fastapi": (900.0, 900.0), "src.index": (200.0, 1100.0)}
+    problems = check(timings, {"fastapi", "sqlite3"}, budget_ms=1000)
+    assert problems == [
+        "sqlite3 is imported at start-up",
+        "import took 1100 ms, budget 1000 ms",
+    ]
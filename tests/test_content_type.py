@@ -17,3 +17,16 @@ def test_openapi_content_type(monkeypatch):
     client = TestClient(src.index.app)
     r = client.get("/spec.json?v=16")
     assert r.headers["content-type"].startswith("application/json")
+
+
+def test_json_responses_skip_the_encoder(monkeypatch):
+    from src.utils import responses
+
+    r = responses.json_response({"name": "Café", "n": [1, 2]})
+    assert r.body == b'{"name":"Caf\xc3\xa9","n":[1,2]}'
+    assert responses.dumps({"a": None}) == b'{"a":null}'
+    assert src.index.app.router.default_response_class is responses.FastJSONResponse
+
+    raw = responses.RawJSONResponse(b'{"already":"encoded"}')
+    assert raw.body == b'{"already":"encoded"}'
+    assert raw.headers["content-type"] == "application/json"
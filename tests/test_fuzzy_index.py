@@ -0,0 +1,103 @@
+import asyncio
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.services import spotify
+from src.services.spotify import SpotifyClient
+from src.utils import fuzzy
+
+
+def test_trigram_index_tolerates_typos_and_rejects_ties():
+    index = fuzzy.TrigramIndex()
+    index.add(1, "Bohemian Rhapsody", "queen")
+    index.add(2, "Don't Stop Me Now", "queen-2")
+    index.add(3, "House 2024", "h24")
+    index.add(4, "House 2025", "h25")
+
+    assert index.best("bohemian rapsody") == "queen"
+    assert index.best("Dont stop me now!") == "queen-2"
+    assert index.best("something else entirely") is None
+    # Equally close to two different playlists: ambiguous.
+    assert index.best("House 2026", min_score=0.5) is None
+
+    index.remove(1)
+    assert index.best("bohemian rapsody") is None
+
+
+def test_track_indexes_evict_least_recent_user():
+    indexes = fuzzy.TrackIndexes(maxsize=2)
+    indexes.add_tracks("a", [("spotify:track:1", "Song", ["Artist"])])
+    indexes.add_tracks("b", [("spotify:track:2", "Song", [])])
+    indexes.get("a")
+    indexes.add_tracks("c", [("spotify:track:3", "Song", [])])
+
+    assert indexes.get("b") is None
+    assert indexes.get("a").best("Song - Artist") == "spotify:track:1"
+
+
+def test_known_tracks_resolve_without_search(monkeypatch):
+    monkeypatch.setattr(fuzzy, "track_indexes", fuzzy.TrackIndexes())
+    client = SpotifyClient("token")
+    client._user_id = "me"
+    searches = []
+
+    async def fake_search(query, limit=10):
+        searches.append(query)
+        return [{"uri": "spotify:track:new"}]
+
+    monkeypatch.setattr(client, "search_track", fake_search)
+    client._index_tracks([
+        {"title": "Smells Like Teen Spirit", "track_uri": "spotify:track:nirvana",
+         "artists": [{"name": "Nirvana"}]},
+    ])
+
+    resolved = asyncio.run(
+        client.resolve_titles(["smells like teen sprit nirvana", "Unknown Song"])
+    )
+
+    assert resolved == ["spotify:track:nirvana", "spotify:track:new"]
+    assert searches == ["Unknown Song"]
+
+
+def test_find_playlist_falls_back_to_fuzzy_match(monkeypatch):
+    monkeypatch.setattr(spotify, "_PLAYLIST_MATCHERS", spotify.OrderedDict())
+    client = SpotifyClient("token")
+    client._user_id = "me"
+    playlists = [
+        {"id": "1", "name": "Road Trip Classics"},
+        {"id": "2", "name": "Chill Evening"},
+    ]
+
+    async def fake_index(refresh=False):
+        return playlists
+
+    monkeypatch.setattr(client, "_playlist_index", fake_index)
+
+    assert asyncio.run(client.find_playlist("chill")) == playlists[1]
+    assert asyncio.run(client.find_playlist("road trip clasics")) == playlists[0]
+    assert asyncio.run(client.find_playlist("workout")) is None
+    # Playlists are only modified by their exact name.
+    assert asyncio.run(client.playlist_by_name("CHILL EVENING")) == playlists[1]
+
+
+def test_local_matches_stay_with_their_user(monkeypatch):
+    monkeypatch.setattr(fuzzy, "track_indexes", fuzzy.TrackIndexes())
+    searches = []
+
+    async def fake_search(query, limit=10):
+        searches.append(query)
+        return [{"uri": "spotify:track:adele"}]
+
+    alice = SpotifyClient("token-a")
+    alice._user_id = "alice"
+    alice._index_tracks([
+        {"title": "Hello", "track_uri": "spotify:track:lionel", "artists": []},
+    ])
+    bob = SpotifyClient("token-b")
+    bob._user_id = "bob"
+    monkeypatch.setattr(alice, "search_track", fake_search)
+    monkeypatch.setattr(bob, "search_track", fake_search)
+
+    assert asyncio.run(alice.resolve_titles(["Hello"])) == ["spotify:track:lionel"]
+    assert asyncio.run(bob.resolve_titles(["Hello"])) == ["spotify:track:adele"]
+    assert searches == ["Hello"]
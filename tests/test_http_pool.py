@@ -0,0 +1,62 @@
+import os, sys, importlib
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+from fastapi.testclient import TestClient
+
+
+def test_lifespan_shares_pooled_client(monkeypatch):
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    monkeypatch.setenv("REDIRECT_URI", "https://example.com/callback")
+    import src.index, api.index
+    import src.utils.http as http
+
+    created = []
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        if request.url.path == "/v1/me":
+            return httpx.Response(200, json={"id": "me"})
+        return httpx.Response(200, json={"items": [{"name": "Chill", "id": "p1"}], "next": None})
+
+    def fake_create():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(http, "create_async_client", fake_create)
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+
+    with TestClient(api.index.app) as client:
+        for _ in range(2):
+            r = client.get("/playlist", params={"name": "chill"}, headers={"Authorization": "Bearer pool-token"})
+            assert r.status_code == 200
+        assert http._client is created[0]
+
+    assert len(created) == 1
+    assert created[0].is_closed
+    assert http._client is None
+    # The user id and playlist index are cached after the first request.
+    assert seen == ["/v1/me", "/v1/me/playlists"]
+
+
+def test_client_is_opened_on_first_use_without_lifespan(monkeypatch):
+    import asyncio
+    import src.utils.http as http
+
+    created = []
+    monkeypatch.setattr(http, "_client", None)
+    monkeypatch.setattr(http, "_client_loop", None)
+    monkeypatch.setattr(http, "create_async_client", lambda: created.append(httpx.AsyncClient()) or created[-1])
+
+    async def invocation():
+        return [await http.get_http_client() for _ in range(2)]
+
+    first = asyncio.run(invocation())
+    second = asyncio.run(invocation())
+
+    # Shared within an event loop, never carried over to the next one.
+    assert first == [created[0]] * 2
+    assert second == [created[1]] * 2
+    assert len(created) == 2
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 import importlib
@@ -16,9 +17,9 @@ def test_lastfm_tags(monkeypatch):
         def json(self):
             return {"toptags": {"tag": [{"name": "rock"}, {"name": "pop"}]}}
 
-    def fake_cached(params, ttl=21600):
+    async def fake_cached(params, ttl=21600):
         return FakeResp().json()
 
     monkeypatch.setattr(service, "_cached", fake_cached)
-    tags = service.track_tags("artist", "title")
+    tags = asyncio.run(service.track_tags("artist", "title"))
     assert tags == ["rock", "pop"]
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+
+from src.services import lastfm
+from src.services.lastfm import LastFMService
+from src.utils.cache import TwoTierCache
+from src.utils.ratelimit import TokenBucket
+
+
+def test_track_tags_batch_reads_cache_once_and_fetches_misses(monkeypatch, fake_redis):
+    fetched = []
+    mgets = []
+
+    async def fake_get(url, params=None, deadline=None, **labels):
+        fetched.append(params["track"])
+        body = {"toptags": {"tag": [{"name": params["track"] + "-tag"}, {"name": "x"}]}}
+        return httpx.Response(200, json=body, request=httpx.Request("GET", url))
+
+    original_mget = fake_redis.mget
+
+    def recording_mget(*keys):
+        mgets.append(keys)
+        return original_mget(*keys)
+
+    monkeypatch.setattr(fake_redis, "mget", recording_mget)
+    monkeypatch.setattr(lastfm, "async_get", fake_get)
+    monkeypatch.setattr(lastfm, "_cache", TwoTierCache())
+    monkeypatch.setattr(lastfm, "lastfm_limiter", TokenBucket(rate=1000, capacity=1000))
+    service = LastFMService()
+    service.api_key = "k"
+    cached_key = service._cache_key(service._tags_params("A", "cached"))
+    fake_redis.store[cached_key] = json.dumps({"toptags": {"tag": {"name": "stored"}}})
+
+    pairs = [("A", "one"), ("A", "cached"), ("A", "two"), ("A", "one")]
+    tags = asyncio.run(service.track_tags_batch(pairs, limit=1))
+
+    assert tags == [["one-tag"], ["stored"], ["two-tag"], ["one-tag"]]
+    assert sorted(fetched) == ["one", "two"]
+    assert len(mgets) == 1 and len(mgets[0]) == 3
+
+    # Everything is now cached in process: no further Redis or API calls.
+    again = asyncio.run(service.track_tags_batch(pairs, limit=2))
+    assert again[0] == ["one-tag", "x"]
+    assert len(mgets) == 1 and len(fetched) == 2
+
+
+def test_track_tags_batch_survives_a_failed_lookup(monkeypatch, fake_redis):
+    fetched = []
+
+    async def fake_get(url, params=None, deadline=None, **labels):
+        fetched.append(params["track"])
+        if params["track"] == "down":
+            raise httpx.ConnectError("unreachable")
+        body = {"toptags": {"tag": [{"name": params["track"] + "-tag"}]}}
+        return httpx.Response(200, json=body, request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(lastfm, "async_get", fake_get)
+    monkeypatch.setattr(lastfm, "_cache", TwoTierCache())
+    monkeypatch.setattr(lastfm, "lastfm_limiter", TokenBucket(rate=1000, capacity=1000))
+    service = LastFMService()
+    service.api_key = "k"
+
+    pairs = [("A", "one"), ("A", "down")]
+    assert asyncio.run(service.track_tags_batch(pairs)) == [["one-tag"], []]
+    # The successful lookup was cached; the failed one is retried next time.
+    assert asyncio.run(service.track_tags_batch(pairs)) == [["one-tag"], []]
+    assert fetched == ["one", "down", "down"]
+    assert service._cache_key(service._tags_params("A", "down")) not in fake_redis.store
@@ -0,0 +1,137 @@
+import asyncio
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+from fastapi.testclient import TestClient
+
+from src.services.library import LibraryMirror
+from src.services.spotify import SpotifyClient
+
+
+def _saved(i, artist="Band"):
+    return {
+        "added_at": f"2024-01-{i:02d}T00:00:00Z",
+        "track": {
+            "name": f"Song {i}", "uri": f"spotify:track:{i}", "duration_ms": 1000 * i,
+            "album": {"name": f"Album {i % 2}"}, "artists": [{"name": artist}],
+        },
+    }
+
+
+class Library:
+    """Serves ``/me/tracks`` newest first, recording the requested offsets."""
+
+    def __init__(self, items):
+        self.items = items
+        self.offsets = []
+
+    def handler(self, request):
+        if request.url.path == "/v1/me":
+            return httpx.Response(200, json={"id": "me"})
+        assert request.url.params["market"] == "from_token"
+        offset = int(request.url.params.get("offset", 0))
+        limit = int(request.url.params.get("limit", 50))
+        self.offsets.append(offset)
+        newest = sorted(self.items, key=lambda i: i["added_at"], reverse=True)
+        page = newest[offset : offset + limit]
+        more = offset + limit < len(newest)
+        return httpx.Response(200, json={
+            "items": page, "total": len(newest), "next": "more" if more else None,
+        })
+
+    def client(self):
+        return SpotifyClient("t", httpx.AsyncClient(transport=httpx.MockTransport(self.handler)))
+
+
+def test_sync_stops_at_the_watermark_and_resyncs_after_removals(tmp_path):
+    lib = Library([_saved(i) for i in range(1, 21)])
+    mirror = LibraryMirror(str(tmp_path / "lib.sqlite3"))
+    client = lib.client()
+
+    assert asyncio.run(mirror.sync(client, "me", "tracks")) == 20
+    assert mirror.count("me", "tracks") == 20
+
+    # Two new saves: one page, nothing older than the watermark refetched.
+    lib.items += [_saved(25), _saved(26)]
+    lib.offsets.clear()
+    assert asyncio.run(mirror.sync(client, "me", "tracks")) == 3  # 26, 25 and the watermark item
+    assert lib.offsets == [0]
+    assert mirror.query("me", "tracks", limit=2)[0]["track"]["name"] == "Song 26"
+
+    # An unsaved track makes the totals disagree: full resync in the background.
+    lib.items = [item for item in lib.items if item["track"]["uri"] != "spotify:track:3"]
+
+    async def sync_then_resync():
+        await mirror.sync(client, "me", "tracks")
+        stale = mirror.count("me", "tracks")
+        await asyncio.gather(*mirror._resyncs.values())
+        return stale
+
+    assert asyncio.run(sync_then_resync()) == 22
+    assert mirror.count("me", "tracks") == 21
+    assert all(t["track"]["uri"] != "spotify:track:3" for t in mirror.query("me", "tracks", limit=None))
+
+
+def test_skipped_entries_do_not_trigger_resyncs(tmp_path):
+    local = {"added_at": "2024-01-30T00:00:00Z", "track": None}
+    lib = Library([_saved(i) for i in range(1, 6)] + [local])
+    mirror = LibraryMirror(str(tmp_path / "lib.sqlite3"))
+    client = lib.client()
+
+    assert asyncio.run(mirror.sync(client, "me", "tracks")) == 6
+    lib.offsets.clear()
+
+    async def sync():
+        await mirror.sync(client, "me", "tracks")
+        return dict(mirror._resyncs)
+
+    assert asyncio.run(sync()) == {}
+    assert lib.offsets == [0]
+    assert (mirror.count("me", "tracks"), mirror.size("me", "tracks")) == (5, 6)
+
+
+def test_query_filters_and_sorts(tmp_path):
+    mirror = LibraryMirror(str(tmp_path / "lib.sqlite3"))
+    mirror.store("me", "tracks", [_saved(1, "Daft Punk"), _saved(2, "Björk"), _saved(3, "björk_x")])
+    mirror.store("other", "tracks", [_saved(4, "Björk")])
+
+    by_artist = mirror.query("me", "tracks", artist="BJÖRK", sort="duration_ms", order="asc")
+    assert [t["track"]["name"] for t in by_artist] == ["Song 2", "Song 3"]
+    assert [t["track"]["name"] for t in mirror.query("me", "tracks", q="album 1")] == ["Song 3", "Song 1"]
+    # LIKE wildcards in the query are literal.
+    assert [t["track"]["name"] for t in mirror.query("me", "tracks", q="k_x")] == ["Song 3"]
+    assert mirror.query("me", "tracks", q="%") == []
+    page = mirror.query("me", "tracks", sort="name", order="asc", limit=1, offset=1)
+    assert [t["track"]["name"] for t in page] == ["Song 2"]
+
+
+def test_library_endpoint_serves_the_mirror(monkeypatch, tmp_path):
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    monkeypatch.setenv("REDIRECT_URI", "https://example.com/callback")
+    import api.index
+    import src.index
+    import src.utils
+    from src.services import library
+
+    lib = Library([_saved(i) for i in range(1, 121)])
+    monkeypatch.setattr(library, "library_mirror", LibraryMirror(str(tmp_path / "lib.sqlite3")))
+    monkeypatch.setattr(src.utils, "get_redis_spotify_client", lib.client)
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+    client = TestClient(api.index.app)
+
+    r = client.get("/library/tracks", params={"q": "song 11", "sort": "name", "order": "asc"})
+    assert r.status_code == 200
+    names = [t["track"]["name"] for t in r.json()]
+    assert names == ["Song 11"] + [f"Song {i}" for i in range(110, 120)]
+    assert r.json()[0] == {"added_at": "2024-01-11T00:00:00Z", "track": {
+        "name": "Song 11", "uri": "spotify:track:11", "duration_ms": 11000,
+        "album": {"name": "Album 1"}, "artists": [{"name": "Band"}],
+    }}
+    requests = len(lib.offsets)
+    client.get("/library/tracks", params={"limit": 5})
+    assert len(lib.offsets) == requests  # synced recently: no upstream call
+    assert client.get("/library/tracks", params={"sort": "popularity"}).status_code == 422
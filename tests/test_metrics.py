@@ -0,0 +1,59 @@
+import os, sys, importlib
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+from fastapi.testclient import TestClient
+
+from src.utils import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    hist.observe(0.05, "/a")
+    hist.observe(0.5, "/a")
+    hist.observe(3, "/a")
+    lines = hist.render()
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{route="/a"} 3' in lines
+    assert metrics.endpoint_template("/v1/playlists/abc/tracks") == "/playlists/{id}/tracks"
+    assert metrics.endpoint_template("/v1/users/bob/playlists") == "/users/{id}/playlists"
+
+
+def test_metrics_endpoint_reports_routes_upstreams_and_caches(monkeypatch):
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    monkeypatch.setenv("REDIRECT_URI", "https://example.com/callback")
+    import src.index, api.index
+    import src.utils.http as http
+
+    def handler(request):
+        if request.url.path == "/v1/me":
+            return httpx.Response(200, json={"id": "me"})
+        return httpx.Response(200, json={"items": [{"name": "Chill", "id": "p1"}], "next": None})
+
+    monkeypatch.setattr(
+        http, "create_async_client",
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+    route = ("GET", "/playlist", "200")
+    upstream = ("spotify", "GET /me/playlists", "200")
+    before = metrics.REQUEST_LATENCY.count(*route)
+    upstream_before = metrics.UPSTREAM_LATENCY.count(*upstream)
+    hits_before = metrics.CACHE_REQUESTS.value("playlist_index", "hit")
+
+    with TestClient(api.index.app) as client:
+        for _ in range(2):
+            r = client.get("/playlist", params={"name": "chill"}, headers={"Authorization": "Bearer metrics-token"})
+            assert r.status_code == 200
+        body = client.get("/metrics").text
+
+    assert metrics.REQUEST_LATENCY.count(*route) == before + 2
+    assert metrics.UPSTREAM_LATENCY.count(*upstream) == upstream_before + 1
+    assert metrics.CACHE_REQUESTS.value("playlist_index", "hit") == hits_before + 1
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/playlist",status="200"}' in body
+    assert 'cache_requests_total{cache="playlist_index",result="hit"}' in body
+    # The /metrics request itself is in flight while rendering.
+    assert "http_requests_in_flight 1.0" in body
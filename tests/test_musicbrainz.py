@@ -1,3 +1,4 @@
+import asyncio
 import os, sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -6,13 +7,60 @@ from src.services.musicbrainz import MusicBrainz
 
 def test_musicbrainz_year(monkeypatch):
     mb = MusicBrainz()
-    monkeypatch.setattr("src.services.musicbrainz._redis", type("R", (), {"get": lambda s,k: None, "set": lambda *a, **kw: None})())
     class FakeResp:
         status_code = 200
         def json(self):
             return {"recordings": [{"releases": [{"date": "1984-01-01"}]}]}
-    def fake_safe_get(url, params=None, headers=None):
+    async def fake_async_get(url, params=None, headers=None, deadline=None, **labels):
         return FakeResp()
-    monkeypatch.setattr("src.services.musicbrainz.safe_get", fake_safe_get)
-    year = mb.first_release_year("a", "t")
+    monkeypatch.setattr("src.services.musicbrainz.async_get", fake_async_get)
+    year = asyncio.run(mb.first_release_year("a", "t"))
     assert year == 1984
+
+
+def test_release_years_batches_queries_and_caches_misses(monkeypatch, fake_redis):
+    from src.services import musicbrainz
+    from src.utils.ratelimit import TokenBucket
+
+    queries = []
+
+    class FakeResp:
+        status_code = 200
+        def __init__(self, body):
+            self.body = body
+        def json(self):
+            return self.body
+
+    async def fake_async_get(url, params=None, headers=None, deadline=None, **labels):
+        queries.append(params["query"])
+        if " OR " in params["query"]:
+            # The combined search only finds the first pair.
+            return FakeResp({"recordings": [
+                {"title": "One", "artist-credit": [{"name": "A"}],
+                 "releases": [{"date": "1990-05-01"}, {"date": "1988"}]},
+                {"title": "Other", "artist-credit": [{"name": "B"}],
+                 "releases": [{"date": "1970"}]},
+            ]})
+        if 'recording:"Two"' in params["query"]:
+            return FakeResp({"recordings": [{"releases": [{"date": "2001-02-03"}]}]})
+        return FakeResp({"recordings": []})
+
+    monkeypatch.setattr(musicbrainz, "async_get", fake_async_get)
+    monkeypatch.setattr(musicbrainz, "musicbrainz_limiter", TokenBucket(rate=1000, capacity=1))
+    mb = MusicBrainz()
+    fake_redis.store[mb._cache_key("C", "cached")] = "1975"
+
+    pairs = [("A", "One"), ("B", "Two"), ("C", "cached"), ("D", 'Say "Hi"')]
+    years = asyncio.run(mb.release_years(pairs))
+
+    assert years == [1988, 2001, 1975, None]
+    assert len(queries) == 3
+    assert queries[0] == (
+        '(artist:"A" AND recording:"One") OR (artist:"B" AND recording:"Two") '
+        'OR (artist:"D" AND recording:"Say \\"Hi\\"")'
+    )
+    assert fake_redis.store[mb._cache_key("D", 'Say "Hi"')] == "-"
+
+    # Hits and misses are both served from the cache afterwards.
+    assert asyncio.run(mb.release_years(pairs)) == years
+    assert len(queries) == 3
@@ -11,6 +11,10 @@ def _setup(monkeypatch, resp):
     importlib.reload(src.tracks)
 
     class DummyAsyncClient:
+        is_closed = False
+
+        def __init__(self, **kwargs):
+            pass
         async def __aenter__(self):
             return self
         async def __aexit__(self, exc_type, exc, tb):
@@ -18,7 +22,12 @@ def _setup(monkeypatch, resp):
         async def get(self, *args, **kwargs):
             return resp
 
-    monkeypatch.setattr(src.tracks, "valid_access_token", lambda: "abc")
+    async def fake_token(http_client=None, user_id=None):
+        return "abc"
+
+    monkeypatch.setattr(src.auth, "valid_access_token", fake_token)
+    # Each test gets its own "currently playing" reply, not the last one.
+    monkeypatch.setattr("src.services.spotify._RECENT_GETS", {})
     monkeypatch.setattr(src.tracks.httpx, "AsyncClient", DummyAsyncClient)
     importlib.reload(api.index)
     return TestClient(api.index.app)
@@ -37,6 +46,7 @@ def test_currently_playing_none(monkeypatch):
 def test_currently_playing_track(monkeypatch):
     class Resp:
         status_code = 200
+        content = b'{"is_playing": true}'
         def json(self):
             return {"is_playing": True}
     client = _setup(monkeypatch, Resp())
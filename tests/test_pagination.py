@@ -0,0 +1,45 @@
+import asyncio
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+
+from src.services.spotify import SpotifyClient
+
+
+def _library(total):
+    offsets = []
+
+    def handler(request):
+        offset = int(request.url.params["offset"])
+        limit = int(request.url.params["limit"])
+        offsets.append(offset)
+        items = [{"n": i} for i in range(offset, min(offset + limit, total))]
+        return httpx.Response(200, json={"items": items, "total": total})
+
+    return handler, offsets
+
+
+def test_paginate_fetches_all_pages_in_order():
+    handler, offsets = _library(120)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            client = SpotifyClient("token", http_client=http)
+            return await client.get_library_tracks(limit=None)
+
+    items = asyncio.run(run())
+    assert [i["n"] for i in items] == list(range(120))
+    assert sorted(offsets) == [0, 50, 100]
+
+
+def test_paginate_stops_at_max_items():
+    handler, offsets = _library(500)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            client = SpotifyClient("token", http_client=http)
+            return await client.get_playlists(limit=70, offset=10)
+
+    items = asyncio.run(run())
+    assert [i["n"] for i in items] == list(range(10, 80))
+    assert sorted(offsets) == [10, 60]
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+
+from src import storage
+from src.services import spotify
+from src.services.spotify import SpotifyClient
+
+
+def _handler(calls, playlists):
+    def handler(request):
+        calls.append((request.method, request.url.path))
+        if request.url.path == "/v1/me":
+            return httpx.Response(200, json={"id": "indexer"})
+        if request.method == "POST":
+            return httpx.Response(201, json={"id": "new1", "name": "Fresh Mix", "owner": {"id": "indexer"}})
+        return httpx.Response(200, json={"items": playlists, "total": len(playlists)})
+    return handler
+
+
+def test_name_lookups_use_cached_index(fake_redis):
+    calls = []
+    playlists = [{"id": "p1", "name": "Road Trip", "owner": {"id": "indexer"}}]
+
+    async def run():
+        transport = httpx.MockTransport(_handler(calls, playlists))
+        async with httpx.AsyncClient(transport=transport) as http:
+            client = SpotifyClient("index-token", http_client=http)
+            exact = await client.playlist_by_name("road trip")
+            fuzzy = await client.find_playlist("TRIP")
+            await client.create_playlist("Fresh Mix", public=False)
+            created = await client._playlist_id("fresh mix")
+            return exact, fuzzy, created
+
+    exact, fuzzy, created = asyncio.run(run())
+    assert exact["id"] == fuzzy["id"] == "p1"
+    assert created == "new1"
+    assert calls.count(("GET", "/v1/me/playlists")) == 1
+    index = json.loads(fake_redis.get("playlists:indexer"))
+    assert [p["id"] for p in index["playlists"]] == ["new1", "p1"]
+
+
+def test_stale_index_refreshes_in_background(fake_redis):
+    calls = []
+    playlists = [{"id": "p2", "name": "Late Night", "owner": {"id": "indexer"}}]
+    storage.save_playlist_index("indexer", [SpotifyClient._index_entry(playlists[0])], built_at=1)
+
+    async def run():
+        transport = httpx.MockTransport(_handler(calls, playlists))
+        async with httpx.AsyncClient(transport=transport) as http:
+            client = SpotifyClient("index-token", http_client=http)
+            found = await client.find_playlist("late")
+            assert ("GET", "/v1/me/playlists") not in calls
+            await asyncio.gather(*spotify._BACKGROUND_TASKS)
+            return found
+
+    assert asyncio.run(run())["id"] == "p2"
+    assert ("GET", "/v1/me/playlists") in calls
+    assert storage.load_playlist_index("indexer")["built_at"] > 1
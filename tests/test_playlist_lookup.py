@@ -19,6 +19,10 @@ def test_playlist_lookup(monkeypatch):
             return self._data
 
     class DummyAsyncClient:
+        is_closed = False
+
+        def __init__(self, **kwargs):
+            pass
         async def __aenter__(self):
             return self
         async def __aexit__(self, exc_type, exc, tb):
@@ -26,7 +30,7 @@ def test_playlist_lookup(monkeypatch):
         async def get(self, url, headers=None, params=None):
             if url.endswith("/me"):
                 return DummyResp({"id": "me"})
-            if url.startswith("https://api.spotify.com/v1/users/me/playlists"):
+            if url.startswith("https://api.spotify.com/v1/me/playlists"):
                 return DummyResp({
                     "items": [
                         {"name": "House 2025", "id": "abcd", "owner": {"id": "me"}}
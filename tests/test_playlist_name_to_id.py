@@ -20,6 +20,10 @@ def test_name_resolves_to_id(monkeypatch):
             return self._data
 
     class DummyAsyncClient:
+        is_closed = False
+
+        def __init__(self, **kwargs):
+            pass
         async def __aenter__(self):
             return self
         async def __aexit__(self, exc_type, exc, tb):
@@ -34,6 +38,8 @@ def test_name_resolves_to_id(monkeypatch):
                     ],
                     "next": None,
                 })
+            if url == "https://api.spotify.com/v1/playlists/1234567890123456789012":
+                return DummyResp({"snapshot_id": "s1"})
             if url.startswith("https://api.spotify.com/v1/playlists/1234567890123456789012/tracks"):
                 return DummyResp({"items": []})
             raise AssertionError(f"unexpected {url}")
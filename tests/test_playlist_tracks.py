@@ -0,0 +1,150 @@
+import json
+import os, sys, importlib
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+from fastapi.testclient import TestClient
+
+PLAYLIST_ID = "1234567890123456789012"
+AUTH = {"Authorization": "Bearer x"}
+
+
+def _item(i):
+    return {"track": {
+        "name": f"t{i}", "uri": f"spotify:track:{i}", "album": {"name": "a"},
+        "artists": [], "duration_ms": 1000, "explicit": False,
+    }}
+
+
+def _client(monkeypatch, total=150, snapshot=None):
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    monkeypatch.setenv("REDIRECT_URI", "https://example.com/callback")
+    import src.index, api.index
+    import src.utils.http as http
+
+    requests = []
+    snapshot = snapshot if snapshot is not None else {"id": "s1"}
+
+    def handler(request):
+        path = request.url.path
+        if path == f"/v1/playlists/{PLAYLIST_ID}":
+            assert request.url.params["fields"] == "snapshot_id"
+            return httpx.Response(200, json={"snapshot_id": snapshot["id"]})
+        if path == "/v1/search":
+            q = request.url.params["q"]
+            return httpx.Response(200, json={"tracks": {"items": [_item(q)["track"]]}})
+        if request.method == "POST":
+            snapshot["id"] = "s-added"
+            return httpx.Response(201, json={"snapshot_id": snapshot["id"]})
+        if request.method == "DELETE":
+            snapshot["id"] = "s-removed"
+            return httpx.Response(200, json={"snapshot_id": snapshot["id"]})
+        requests.append(request.url.params)
+        offset = int(request.url.params["offset"])
+        limit = int(request.url.params["limit"])
+        items = [_item(i) for i in range(offset, min(offset + limit, total))]
+        items.append({"track": None})  # local or unavailable entries are skipped
+        return httpx.Response(200, json={"items": items, "total": total})
+
+    monkeypatch.setattr(
+        http, "create_async_client",
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+    return TestClient(api.index.app), requests
+
+
+def test_playlist_tracks_are_fully_paginated(monkeypatch):
+    client, requests = _client(monkeypatch)
+    with client:
+        r = client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH)
+    assert r.status_code == 200
+    tracks = r.json()["tracks"]
+    assert [t["title"] for t in tracks] == [f"t{i}" for i in range(150)]
+    assert sorted(int(p["offset"]) for p in requests) == [0, 100]
+    assert all(p["fields"].startswith("total,next,items(track(") for p in requests)
+
+
+def test_playlist_tracks_stream_ndjson(monkeypatch):
+    client, _ = _client(monkeypatch)
+    with client:
+        r = client.get(
+            f"/playlist/{PLAYLIST_ID}/tracks",
+            params={"stream": "true"},
+            headers=AUTH,
+        )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert len(lines) == 150
+    assert lines[-1]["track_uri"] == "spotify:track:149"
+
+
+def test_unchanged_snapshot_is_served_from_cache(monkeypatch):
+    snapshot = {"id": "s1"}
+    client, requests = _client(monkeypatch, total=3, snapshot=snapshot)
+    with client:
+        first = client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH).json()
+        again = client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH).json()
+        assert again == first and len(requests) == 1
+
+        snapshot["id"] = "s2"
+        client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH)
+        assert len(requests) == 2
+
+
+def test_edits_carry_cached_contents_to_new_snapshot(monkeypatch):
+    client, requests = _client(monkeypatch, total=3)
+    with client:
+        client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH)
+        r = client.post(f"/playlist/{PLAYLIST_ID}/tracks", json={"titles": ["new"]}, headers=AUTH)
+        assert r.json()["added"] == ["spotify:track:new"]
+        r = client.request(
+            "DELETE", f"/playlist/{PLAYLIST_ID}/tracks",
+            json={"track_uris": ["spotify:track:0"]}, headers=AUTH,
+        )
+        assert r.status_code == 200
+        tracks = client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH).json()["tracks"]
+    assert [t["title"] for t in tracks] == ["t1", "t2", "tnew"]
+    assert len(requests) == 1
+
+
+def test_edits_after_an_external_change_do_not_reuse_the_cache(monkeypatch):
+    snapshot = {"id": "s1"}
+    client, requests = _client(monkeypatch, total=3, snapshot=snapshot)
+    with client:
+        client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH)
+        # Edited in the Spotify app: the cached s1 contents are stale.
+        snapshot["id"] = "s-external"
+        r = client.post(f"/playlist/{PLAYLIST_ID}/tracks", json={"titles": ["new"]}, headers=AUTH)
+        assert r.status_code == 200
+        client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH)
+    # The added snapshot was fetched from Spotify, not derived from s1.
+    assert len(requests) == 2
+
+
+def test_removal_targets_the_cached_snapshot(monkeypatch):
+    import src.utils.http as http
+
+    client, _ = _client(monkeypatch, total=3)
+    bodies = []
+    create = http.create_async_client
+
+    def recording_client():
+        inner = create()
+
+        async def hook(request):
+            if request.method == "DELETE":
+                bodies.append(json.loads(request.content))
+
+        inner.event_hooks["request"].append(hook)
+        return inner
+
+    monkeypatch.setattr(http, "create_async_client", recording_client)
+    with client:
+        client.get(f"/playlist/{PLAYLIST_ID}/tracks", headers=AUTH)
+        client.request(
+            "DELETE", f"/playlist/{PLAYLIST_ID}/tracks",
+            json={"track_uris": ["spotify:track:0"]}, headers=AUTH,
+        )
+    assert bodies == [{"tracks": [{"uri": "spotify:track:0"}], "snapshot_id": "s1"}]
@@ -0,0 +1,60 @@
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from fastapi.testclient import TestClient
+
+from src.utils.projection import parse_fields, project
+
+TRACK = {
+    "name": "Song", "uri": "spotify:track:1", "available_markets": ["FR"] * 180,
+    "album": {"name": "Album", "images": [{"url": "x"}], "available_markets": ["FR"]},
+    "artists": [{"name": "A", "uri": "spotify:artist:a", "external_urls": {}}],
+}
+
+
+def test_parse_and_project_nested_fields():
+    tree = parse_fields("name, album(name), artists(name,uri), missing")
+    assert project([TRACK], tree) == [{
+        "name": "Song",
+        "album": {"name": "Album"},
+        "artists": [{"name": "A", "uri": "spotify:artist:a"}],
+    }]
+    for bad in ["", "name,,uri", "album(name", "album()", "name)"]:
+        with pytest.raises(ValueError):
+            parse_fields(bad)
+
+
+def test_search_is_compact_by_default_and_pushes_market(monkeypatch):
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    monkeypatch.setenv("REDIRECT_URI", "https://example.com/callback")
+    import api.index
+    import src.index
+    import src.utils
+
+    calls = []
+
+    class DummyClient:
+        async def search(self, q, type="track", limit=10, market=None):
+            calls.append(market)
+            return {"tracks": {"items": [TRACK], "total": 1, "href": "h", "next": None}}
+
+    monkeypatch.setattr(src.utils, "get_redis_spotify_client", lambda: DummyClient())
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+    client = TestClient(api.index.app)
+
+    compact = client.get("/search", params={"q": "song"}).json()
+    assert compact == {"tracks": {"items": [{
+        "name": "Song", "uri": "spotify:track:1",
+        "artists": [{"name": "A", "uri": "spotify:artist:a"}],
+        "album": {"name": "Album"},
+    }], "total": 1}}
+
+    assert client.get("/search", params={"q": "s", "fields": "name"}).json()["tracks"]["items"] == [{"name": "Song"}]
+    raw = client.get("/search", params={"q": "s", "fields": "*"}).json()
+    assert raw["tracks"]["items"][0]["available_markets"] == TRACK["available_markets"]
+    assert calls == ["from_token", "from_token", None]
+    assert client.get("/search", params={"q": "s", "fields": "name("}).status_code == 400
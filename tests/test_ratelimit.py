@@ -0,0 +1,92 @@
+import asyncio
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+
+from src.services import spotify
+from src.services.spotify import SpotifyClient
+from src.utils import ratelimit
+from src.utils.ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+def test_token_bucket_paces_after_burst(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", clock.sleep)
+    bucket = TokenBucket(rate=2, capacity=2)
+
+    async def run():
+        return [await bucket.acquire() for _ in range(4)]
+
+    assert asyncio.run(run()) == [0, 0, 0.5, 0.5]
+    stats = bucket.stats()
+    assert stats["acquired"] == 4
+    assert stats["queue_depth"] == 0
+    assert stats["total_wait_seconds"] == 1.0
+
+
+def test_request_waits_out_429(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", clock.sleep)
+    monkeypatch.setattr(spotify, "spotify_limiter", TokenBucket(rate=10, capacity=10))
+    responses = iter([
+        httpx.Response(429, headers={"Retry-After": "3"}),
+        httpx.Response(200, json={"id": "me"}),
+    ])
+
+    async def run():
+        transport = httpx.MockTransport(lambda request: next(responses))
+        async with httpx.AsyncClient(transport=transport) as http:
+            return await SpotifyClient("t", http_client=http).get_profile()
+
+    assert asyncio.run(run()) == {"id": "me"}
+    assert spotify.spotify_limiter.stats()["throttled"] == 1
+    assert clock.sleeps == [3.0]
+
+
+def test_long_retry_after_fails_fast_instead_of_stalling(monkeypatch):
+    from fastapi import HTTPException
+
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", clock.sleep)
+    monkeypatch.setattr(spotify, "spotify_limiter", TokenBucket(rate=10, capacity=10))
+    monkeypatch.setattr(spotify, "SPOTIFY_MAX_RETRY_AFTER", 30)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(429, headers={"Retry-After": "3600"})
+
+    async def run():
+        errors = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            for _ in range(2):
+                try:
+                    await SpotifyClient("t", http_client=http).get_profile()
+                except HTTPException as exc:
+                    errors.append(exc)
+        return errors
+
+    first, second = asyncio.run(run())
+    assert first.status_code == second.status_code == 429
+    # The second call never reached Spotify nor waited for the limiter.
+    assert len(requests) == 1
+    assert clock.sleeps == []
+    assert second.headers == {"Retry-After": "3600"}
+    # Other callers are held no longer than the cap.
+    assert spotify.spotify_limiter._reserve() <= 30
@@ -16,6 +16,10 @@ def test_recent(monkeypatch):
             return {"items": list(range(20))}
 
     class DummyAsyncClient:
+        is_closed = False
+
+        def __init__(self, **kwargs):
+            pass
         async def __aenter__(self):
             return self
         async def __aexit__(self, exc_type, exc, tb):
@@ -24,7 +28,10 @@ def test_recent(monkeypatch):
             assert kwargs.get("params", {}).get("limit") == 20
             return DummyResp()
 
-    monkeypatch.setattr(src.tracks, "valid_access_token", lambda: "abc")
+    async def fake_token(http_client=None, user_id=None):
+        return "abc"
+
+    monkeypatch.setattr(src.auth, "valid_access_token", fake_token)
     monkeypatch.setattr(src.tracks.httpx, "AsyncClient", DummyAsyncClient)
     importlib.reload(api.index)
 
@@ -4,24 +4,12 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 from fastapi.testclient import TestClient
 
 
-def test_no_duplicate_recos(monkeypatch):
+def test_no_duplicate_recos(monkeypatch, fake_redis):
     monkeypatch.setenv("CLIENT_ID", "dummy")
     monkeypatch.setenv("REDIRECT_URI", "https://example.com/callback")
     import src.index, api.index
     import src.services.spotify as spotify
 
-    class FakeRedis:
-        def __init__(self):
-            self.store = {"recommended:me": {"a"}}
-        def smembers(self, k):
-            return list(self.store.get(k, set()))
-        def sadd(self, k, *vals):
-            self.store.setdefault(k, set()).update(vals)
-        def get(self, k):
-            return None
-        def set(self, *a, **k):
-            pass
-
     class DummyResp:
         def __init__(self, data):
             self.status_code = 200
@@ -31,6 +19,10 @@ def test_no_duplicate_recos(monkeypatch):
             return self._data
 
     class DummyAsyncClient:
+        is_closed = False
+
+        def __init__(self, **kwargs):
+            pass
         async def __aenter__(self):
             return self
         async def __aexit__(self, exc_type, exc, tb):
@@ -41,9 +33,8 @@ def test_no_duplicate_recos(monkeypatch):
             return DummyResp({"tracks": [{"uri": "a"}, {"uri": "b"}]})
 
     monkeypatch.setattr(spotify.httpx, "AsyncClient", DummyAsyncClient)
-    fake = FakeRedis()
-    monkeypatch.setattr("src.services.spotify._redis", fake, raising=False)
-    monkeypatch.setattr("src.storage._redis", fake, raising=False)
+    from src import storage
+    storage.remember_recommendations("me", ["a"])
     import src.utils as utils
     monkeypatch.setattr(utils, "get_redis_spotify_client", lambda: spotify.SpotifyClient("token"))
 
@@ -55,3 +46,16 @@ def test_no_duplicate_recos(monkeypatch):
     r = client.get("/recommend")
     assert r.status_code == 200
     assert r.json() == [{"uri": "b"}]
+
+
+def test_recommendation_history_ages_out(monkeypatch, fake_redis):
+    from src import storage
+
+    monkeypatch.setattr(storage.time, "time", lambda: 1000.0)
+    storage.remember_recommendations("u", ["old"])
+    monkeypatch.setattr(storage.time, "time", lambda: 1000.0 + storage.RECOMMENDATION_WINDOW + 1)
+    assert storage.unseen_recommendations("u", ["old", "new"]) == ["old", "new"]
+
+    monkeypatch.setattr(storage, "RECOMMENDATION_MAX", 2)
+    storage.remember_recommendations("u", ["x", "y", "z"])
+    assert len(fake_redis.store["recommended_at:u"]) == 2
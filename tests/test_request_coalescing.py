@@ -0,0 +1,87 @@
+import asyncio
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+
+from src.services import spotify
+from src.services.spotify import SpotifyClient
+
+
+def _client_factory(calls):
+    async def handler(request):
+        calls.append((request.headers["Authorization"], str(request.url)))
+        await asyncio.sleep(0.01)
+        if request.url.path.endswith("/currently-playing"):
+            return httpx.Response(200, json={"is_playing": True, "n": len(calls)})
+        return httpx.Response(200, json={"id": "me", "items": [], "next": None})
+
+    return lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_identical_gets_in_flight_share_one_call(monkeypatch):
+    monkeypatch.setattr(spotify, "_RECENT_GETS", {})
+    calls = []
+    make = _client_factory(calls)
+
+    async def run():
+        async with make() as http:
+            a, b, other = (SpotifyClient(t, http_client=http) for t in ("a", "a", "b"))
+            url = f"{a.base_url}/me/playlists"
+            responses = await asyncio.gather(
+                a._request("GET", url, params={"offset": 0, "limit": 50}),
+                b._request("GET", url, params={"limit": 50, "offset": 0}),
+                a._request("GET", url, params={"offset": 50, "limit": 50}),
+                other._request("GET", url, params={"offset": 0, "limit": 50}),
+            )
+            # Completed GETs outside a result window are not reused.
+            await a._request("GET", url, params={"offset": 0, "limit": 50})
+        return responses
+
+    responses = asyncio.run(run())
+    assert responses[0] is responses[1]
+    assert len(calls) == 4
+    assert sum(auth == "Bearer b" for auth, _ in calls) == 1
+
+
+def test_hot_reads_are_reused_within_their_window(monkeypatch):
+    monkeypatch.setattr(spotify, "_RECENT_GETS", {})
+    monkeypatch.setitem(spotify.RESULT_WINDOWS, "/v1/me/player/currently-playing", 60)
+    calls = []
+    make = _client_factory(calls)
+
+    async def run():
+        async with make() as http:
+            client = SpotifyClient("token", http_client=http)
+            first = await asyncio.gather(*(client.currently_playing() for _ in range(5)))
+            again = await client.currently_playing()
+            monkeypatch.setitem(spotify.RESULT_WINDOWS, "/v1/me/player/currently-playing", 0)
+            fresh = await client.currently_playing()
+        return first, again, fresh
+
+    first, again, fresh = asyncio.run(run())
+    assert first == [{"is_playing": True, "n": 1}] * 5
+    assert again == first[0]
+    assert fresh == {"is_playing": True, "n": 2}
+
+
+def test_waiters_retry_when_the_leading_caller_is_cancelled():
+    from src.utils.singleflight import InlineSingleFlight
+
+    flight = InlineSingleFlight()
+    runs = []
+
+    async def fetch():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return len(runs)
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await waiter
+        return leader.cancelled(), result, flight.in_flight("k")
+
+    assert asyncio.run(run()) == (True, 2, False)
@@ -0,0 +1,90 @@
+import asyncio
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+
+from src.services import lastfm
+from src.services.lastfm import LastFMService, SCROBBLE_BUCKET
+from src.utils.cache import TwoTierCache
+
+DAY0 = 1_700_006_400  # a UTC midnight
+NOW = DAY0 + 2 * SCROBBLE_BUCKET + 3600
+
+
+def _scrobble(ts):
+    return {"name": f"t{ts}", "date": {"uts": str(ts)}}
+
+
+def test_scrobble_history_paginates_and_caches_closed_days(monkeypatch, fake_redis):
+    # Three scrobbles per hour over the two closed days, newest first per page.
+    history = sorted(range(DAY0, NOW, 1200), reverse=True)
+    requests = []
+    ttls = {}
+
+    async def fake_get(url, params=None, deadline=None, **labels):
+        requests.append((params["from"], params["page"]))
+        inside = [ts for ts in history if params["from"] <= ts <= params["to"]]
+        pages = max(1, -(-len(inside) // 50))
+        chunk = inside[(params["page"] - 1) * 50 : params["page"] * 50]
+        body = {"recenttracks": {
+            "track": [{"name": "now", "@attr": {"nowplaying": "true"}}] + [_scrobble(ts) for ts in chunk],
+            "@attr": {"totalPages": str(pages)},
+        }}
+        return httpx.Response(200, json=body, request=httpx.Request("GET", url))
+
+    original_set = fake_redis.set
+
+    def recording_set(k, v, ex=None):
+        ttls[k] = ex
+        original_set(k, v, ex)
+
+    monkeypatch.setattr(fake_redis, "set", recording_set)
+    monkeypatch.setattr(lastfm, "async_get", fake_get)
+    monkeypatch.setattr(lastfm, "_cache", TwoTierCache())
+    monkeypatch.setattr(lastfm.time, "time", lambda: NOW)
+    service = LastFMService()
+    service.api_key, service.user = "k", "u"
+
+    start, end = DAY0 + 600, NOW
+    tracks = asyncio.run(service.scrobble_history(start, end))
+    expected = [ts for ts in history if start <= ts <= end]
+    assert [int(t["date"]["uts"]) for t in tracks] == expected
+    # 72 scrobbles per closed day need two pages; the open day needs one.
+    assert sorted(requests) == [(DAY0, 1), (DAY0, 2),
+                                (DAY0 + SCROBBLE_BUCKET, 1), (DAY0 + SCROBBLE_BUCKET, 2),
+                                (DAY0 + 2 * SCROBBLE_BUCKET, 1)]
+    assert sorted(ttls.values(), key=str) == [lastfm.SCROBBLE_OPEN_TTL, None, None]
+
+    # An overlapping range is served from the cached buckets.
+    requests.clear()
+    monkeypatch.setattr(lastfm, "_cache", TwoTierCache())
+    asyncio.run(service.scrobble_history(DAY0 + SCROBBLE_BUCKET, NOW))
+    assert requests == []
+
+
+def test_scrobble_history_rejects_ranges_over_the_bucket_cap(monkeypatch):
+    import importlib
+    import pytest
+    from fastapi.testclient import TestClient
+
+    requests = []
+
+    async def fake_get(url, params=None, deadline=None, **labels):
+        requests.append(params)
+
+    monkeypatch.setattr(lastfm, "async_get", fake_get)
+    monkeypatch.setattr(lastfm.time, "time", lambda: NOW)
+    service = LastFMService()
+    service.api_key, service.user = "k", "u"
+    with pytest.raises(ValueError):
+        asyncio.run(service.scrobble_history(0, NOW))
+
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    monkeypatch.setenv("REDIRECT_URI", "https://example.com/callback")
+    monkeypatch.setenv("LASTFM_API_KEY", "k")
+    monkeypatch.setenv("LASTFM_USERNAME", "u")
+    import src.index
+    importlib.reload(src.index)
+    r = TestClient(src.index.app).get("/lastfm/scrobbles", params={"start": 0, "end": NOW})
+    assert r.status_code == 400
+    assert requests == []
@@ -0,0 +1,65 @@
+import asyncio
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import storage
+
+
+class PipelineRedis:
+    """Counts round trips: every direct call or pipeline exec is one request."""
+
+    def __init__(self):
+        self.store = {}
+        self.requests = 0
+
+    def get(self, k):
+        self.requests += 1
+        return self.store.get(k)
+
+    def set(self, k, v, ex=None):
+        self.requests += 1
+        self.store[k] = v
+
+    def mget(self, *keys):
+        self.requests += 1
+        return [self.store.get(k) for k in keys]
+
+    def pipeline(self):
+        outer = self
+
+        class Pipe:
+            def __init__(self):
+                self.stack = []
+
+            def set(self, k, v, ex=None):
+                self.stack.append((k, v))
+
+            def exec(self):
+                outer.requests += 1
+                for k, v in self.stack:
+                    outer.store[k] = v
+                return ["OK"] * len(self.stack)
+
+        return Pipe()
+
+
+def test_mset_with_ttl_and_mget_are_single_requests(monkeypatch):
+    fake = PipelineRedis()
+    monkeypatch.setattr(storage, "_redis", fake)
+
+    storage.mset({f"k{i}": str(i) for i in range(30)}, ex=60)
+    values = asyncio.run(storage.amget([f"k{i}" for i in range(30)] + ["missing"]))
+
+    assert values == [str(i) for i in range(30)] + [None]
+    assert fake.requests == 2
+
+
+def test_track_uri_cache_round_trips(monkeypatch):
+    fake = PipelineRedis()
+    monkeypatch.setattr(storage, "_redis", fake)
+
+    storage.save_track_uris({f"song {i}": f"spotify:track:{i}" for i in range(20)} | {"nope": None})
+    cached = storage.load_track_uris(["Song 3", "NOPE", "unknown"])
+
+    assert cached == ["spotify:track:3", "", None]
+    assert fake.requests == 2
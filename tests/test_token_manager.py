@@ -0,0 +1,181 @@
+import asyncio
+import os, sys, time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import httpx
+
+os.environ.setdefault("REDIRECT_URI", "https://example.com/callback")
+from src import auth
+from src.storage import load_tokens, save_tokens
+
+
+def test_concurrent_refresh_is_single_flight(fake_redis, monkeypatch):
+    save_tokens({"access_token": "old", "refresh_token": "r", "expires_at": 0})
+    posts = []
+    loads = []
+    monkeypatch.setattr("src.storage.load_tokens", lambda: loads.append(1) or load_tokens())
+
+    async def handler(request):
+        posts.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"access_token": "new", "expires_in": 3600})
+
+    async def run():
+        manager = auth.TokenManager()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            tokens = await asyncio.gather(*(manager.get(http) for _ in range(10)))
+            again = await manager.get(http)
+        return tokens, again
+
+    tokens, again = asyncio.run(run())
+    assert tokens == ["new"] * 10 and again == "new"
+    assert len(posts) == 1
+    assert len(loads) == 1
+    stored = load_tokens()
+    assert stored["access_token"] == "new"
+    assert stored["expires_at"] > time.time()
+
+
+def test_callback_issues_per_user_sessions(fake_redis, monkeypatch):
+    from fastapi.testclient import TestClient
+    import importlib
+    import src.utils.http as http
+
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    monkeypatch.setattr(auth, "SINGLE_USER_TOKENS", False)
+    import api.index, src.index
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+
+    def handler(request):
+        if request.url.path == "/api/token":
+            code = dict(httpx.QueryParams(request.content.decode()))["code"]
+            return httpx.Response(200, json={
+                "access_token": f"token-{code}", "refresh_token": "r", "expires_in": 3600,
+            })
+        token = request.headers["Authorization"].removeprefix("Bearer ")
+        if request.url.path == "/v1/me":
+            return httpx.Response(200, json={"id": token.replace("token", "user")})
+        return httpx.Response(200, json={"items": [{"name": token}]})
+
+    monkeypatch.setattr(http, "create_async_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    loads = []
+    load_user_tokens = auth.storage.load_user_tokens
+    monkeypatch.setattr(
+        "src.storage.load_user_tokens", lambda user_id: loads.append(user_id) or load_user_tokens(user_id)
+    )
+
+    with TestClient(api.index.app) as client:
+        sessions = {}
+        for code in ("a", "b"):
+            r = client.get("/auth/callback", params={"code": code})
+            assert r.status_code == 200
+            assert auth.SESSION_COOKIE in r.headers["set-cookie"]
+            sessions[code] = r.json()["session"]
+
+        for _ in range(2):
+            for code, session in sessions.items():
+                r = client.get("/top_tracks", headers={"Authorization": f"Bearer {session}"})
+                assert r.json() == {"items": [{"name": f"token-{code}"}]}
+
+        # Anonymous requests no longer share one account.
+        assert client.get("/top_tracks").status_code == 401
+
+    assert fake_redis.store["spotify_tokens:user-a"]
+    assert "spotify_tokens" not in fake_redis.store
+    # Tokens stay in memory until they expire.
+    assert loads == []
+
+
+def test_bearer_without_per_user_record_is_served(fake_redis, monkeypatch):
+    from fastapi.testclient import TestClient
+    import importlib
+    import src.utils.http as http
+
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    import api.index, src.index
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+    # Stored before per-user records existed; the callback never ran since.
+    save_tokens({"access_token": "legacy", "refresh_token": "r", "expires_at": time.time() + 3600})
+    auth.token_manager.set(None)
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers["Authorization"])
+        if request.url.path == "/v1/me":
+            return httpx.Response(200, json={"id": "alice", "display_name": "Alice"})
+        return httpx.Response(200, json={"items": []})
+
+    monkeypatch.setattr(http, "create_async_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    with TestClient(api.index.app) as client:
+        headers = {"Authorization": "Bearer chatgpt-token"}
+        assert client.get("/profile", headers=headers).status_code == 200
+        assert client.get("/top_tracks", headers=headers).status_code == 200
+        # Without the bearer, the single-user record still applies.
+        assert client.get("/top_tracks").status_code == 200
+
+    assert set(seen) == {"Bearer chatgpt-token", "Bearer legacy"}
+
+
+def test_known_user_is_never_served_with_the_single_user_record(fake_redis, monkeypatch):
+    from fastapi.testclient import TestClient
+    import importlib
+    import src.utils.http as http
+    from src import storage
+
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    import api.index, src.index
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+    # Bob's refresh token was revoked; alice authorized last.
+    storage.save_user_tokens("bob", {"access_token": "bob-old", "refresh_token": "revoked", "expires_at": 0})
+    storage.save_session("bob-session", "bob")
+    save_tokens({"access_token": "alice-token", "refresh_token": "r", "expires_at": time.time() + 3600})
+    auth.token_manager.set(None)
+    auth._TOKEN_MANAGERS.pop("bob", None)
+
+    def handler(request):
+        if request.url.path == "/api/token":
+            return httpx.Response(400, json={"error": "invalid_grant"})
+        return httpx.Response(200, json={"id": request.headers["Authorization"]})
+
+    monkeypatch.setattr(http, "create_async_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    with TestClient(api.index.app) as client:
+        r = client.get("/profile", headers={"Authorization": "Bearer bob-session"})
+    assert r.status_code == 401
+
+
+def test_missing_per_user_record_is_not_read_on_every_request(fake_redis, monkeypatch):
+    from fastapi.testclient import TestClient
+    import importlib
+    import src.utils.http as http
+
+    monkeypatch.setenv("CLIENT_ID", "dummy")
+    import api.index, src.index
+    importlib.reload(src.index)
+    importlib.reload(api.index)
+    auth._TOKEN_MANAGERS.pop("carol", None)
+    loads = []
+    load_user_tokens = auth.storage.load_user_tokens
+    monkeypatch.setattr(
+        "src.storage.load_user_tokens", lambda user_id: loads.append(user_id) or load_user_tokens(user_id)
+    )
+
+    def handler(request):
+        return httpx.Response(200, json={"id": "carol"})
+
+    monkeypatch.setattr(http, "create_async_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    with TestClient(api.index.app) as client:
+        for _ in range(5):
+            r = client.get("/profile", headers={"Authorization": "Bearer carol-token"})
+            assert r.status_code == 200
+        # Stored by /auth/callback: picked up at once.
+        auth.token_manager_for("carol").set(
+            {"access_token": "stored", "refresh_token": "r", "expires_at": time.time() + 3600}
+        )
+        assert asyncio.run(auth.valid_access_token(user_id="carol")) == "stored"
+
+    assert loads == ["carol"]
@@ -1,3 +1,4 @@
+import json
 import os, sys, importlib
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from fastapi.testclient import TestClient
@@ -9,7 +10,10 @@ def test_top_tracks_no_token(monkeypatch):
     import src.index, src.tracks, api.index
     importlib.reload(src.index)
     importlib.reload(src.tracks)
-    monkeypatch.setattr(src.tracks, "valid_access_token", lambda: None)
+    async def fake_token(http_client=None, user_id=None):
+        return None
+
+    monkeypatch.setattr(src.auth, "valid_access_token", fake_token)
     importlib.reload(api.index)
     client = TestClient(api.index.app)
     r = client.get("/top_tracks")
@@ -26,10 +30,15 @@ def test_top_tracks_with_token(monkeypatch):
 
     class DummyResp:
         status_code = 200
+        content = b'["ok"]'
         def json(self):
             return ["ok"]
 
     class DummyAsyncClient:
+        is_closed = False
+
+        def __init__(self, **kwargs):
+            pass
         async def __aenter__(self):
             return self
 
@@ -39,7 +48,10 @@ def test_top_tracks_with_token(monkeypatch):
         async def get(self, *args, **kwargs):
             return DummyResp()
 
-    monkeypatch.setattr(src.tracks, "valid_access_token", lambda: "abc")
+    async def fake_token(http_client=None, user_id=None):
+        return "abc"
+
+    monkeypatch.setattr(src.auth, "valid_access_token", fake_token)
     monkeypatch.setattr(src.tracks.httpx, "AsyncClient", DummyAsyncClient)
     importlib.reload(api.index)
 
@@ -57,10 +69,15 @@ def test_top_tracks_params(monkeypatch):
 
     class DummyResp:
         status_code = 200
+        content = json.dumps(list(range(50))).encode()
         def json(self):
             return list(range(50))
 
     class DummyAsyncClient:
+        is_closed = False
+
+        def __init__(self, **kwargs):
+            pass
         async def __aenter__(self):
             return self
         async def __aexit__(self, exc_type, exc, tb):
@@ -70,7 +87,10 @@ def test_top_tracks_params(monkeypatch):
             assert kwargs.get("params", {}).get("time_range") == "long_term"
             return DummyResp()
 
-    monkeypatch.setattr(src.tracks, "valid_access_token", lambda: "abc")
+    async def fake_token(http_client=None, user_id=None):
+        return "abc"
+
+    monkeypatch.setattr(src.auth, "valid_access_token", fake_token)
     monkeypatch.setattr(src.tracks.httpx, "AsyncClient", DummyAsyncClient)
     importlib.reload(api.index)
 
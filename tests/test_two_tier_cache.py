@@ -0,0 +1,58 @@
+import asyncio
+import json
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils import cache as cache_mod
+from src.utils.cache import LRUCache, TwoTierCache
+
+
+def test_concurrent_misses_share_one_load(fake_redis):
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return {"v": 1}
+
+    async def run():
+        cache = TwoTierCache(local_ttl=60)
+        results = await asyncio.gather(*(cache.get("k", load, ttl=600) for _ in range(5)))
+        again = await cache.get("k", load, ttl=600)
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert results == [{"v": 1}] * 5 and again == {"v": 1}
+    assert len(loads) == 1
+    assert json.loads(fake_redis.get("k")) == {"v": 1}
+
+
+def test_stale_entry_is_served_then_refreshed(fake_redis, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache_mod.time, "monotonic", lambda: clock[0])
+    values = iter([{"v": "old"}, {"v": "new"}])
+
+    async def load():
+        return next(values)
+
+    async def run():
+        cache = TwoTierCache(local_ttl=10)
+        first = await cache.get("k", load, ttl=600)
+        clock[0] += 11
+        fake_redis.store.clear()  # Redis copy expired as well
+        stale = await cache.get("k", load, ttl=600)
+        await asyncio.gather(*cache_mod._BACKGROUND_TASKS)
+        fresh = await cache.get("k", load, ttl=600)
+        return first, stale, fresh
+
+    assert asyncio.run(run()) == ({"v": "old"}, {"v": "old"}, {"v": "new"})
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1, 60, 60)
+    lru.set("b", 2, 60, 60)
+    lru.get("a")
+    lru.set("c", 3, 60, 60)
+    assert lru.get("b") is None
+    assert lru.get("a") == (1, True)